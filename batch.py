@@ -0,0 +1,162 @@
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from trace_index import build_index
+from trace_stats import latency_summary, token_usage, load_prices, question_summary
+from trace_input import find_traces, compression, open_trace
+
+DEFAULT_OUTPUT_DIR = "chain-analyzer-report"
+
+def frame_records(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+def summarize_trace(path, skip_xml=True, max_items=None, prices=None, workers=1):
+    started = time.perf_counter()
+    if compression(path):
+        # The summary never reads records back, so nothing is spooled to disk.
+        with open_trace(path) as stream:
+            trace = build_index(path, skip_xml, max_items, stream=stream)
+    else:
+        trace = build_index(path, skip_xml, max_items, workers)
+    parse_seconds = time.perf_counter() - started
+
+    steps = trace.steps
+    latency = latency_summary(steps)
+    usage = token_usage(steps, prices=prices).iloc[0]
+    questions = question_summary(steps, trace.sources, trace.question_names)
+
+    run = {
+        'file': path,
+        'size': os.path.getsize(path),
+        'lines': trace.line_count,
+        'items': len(trace),
+        'questions': len(trace.question_names),
+        'parse_seconds': parse_seconds,
+        'analyzed_pages': int(questions['analyzed_pages'].sum()),
+        'answer_pages': int(questions['answer_pages'].sum()),
+    }
+    run['page_usage'] = run['answer_pages'] / run['analyzed_pages'] if run['analyzed_pages'] else None
+    if len(latency):
+        overall = latency.loc['all steps']
+        run.update({f"duration_{name}": float(overall[name]) for name in latency.columns if name != 'count'})
+    run.update({name: float(usage[name]) for name in ['prompt_tokens', 'completion_tokens', 'total_tokens', 'cost']})
+
+    trace.close()
+    return {
+        'run': run,
+        'latency': frame_records(latency.rename_axis('response_type').reset_index()) if len(latency) else [],
+        'questions': frame_records(questions),
+    }
+
+def failed_result(path, error):
+    return {'run': {'file': path, 'error': str(error)}, 'latency': [], 'questions': []}
+
+def run_batch(paths, workers=1, skip_xml=True, max_items=None, prices=None, on_result=None):
+    results = []
+    if len(paths) == 1 or workers <= 1:
+        for path in paths:
+            try:
+                result = summarize_trace(path, skip_xml, max_items, prices, workers)
+            except Exception as e:
+                result = failed_result(path, e)
+            results.append(result)
+            if on_result:
+                on_result(result)
+        return results
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)), mp_context=context) as executor:
+        futures = {
+            executor.submit(summarize_trace, path, skip_xml, max_items, prices): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = failed_result(futures[future], e)
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    results.sort(key=lambda result: result['run']['file'])
+    return results
+
+def write_report(results, output_dir, fmt='json'):
+    os.makedirs(output_dir, exist_ok=True)
+
+    if fmt == 'json':
+        path = os.path.join(output_dir, "summary.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'runs': results}, f, indent=2)
+        return [path]
+
+    tables = {
+        'runs': pd.DataFrame([result['run'] for result in results]),
+        'latency': pd.DataFrame([
+            {'file': result['run']['file'], **row} for result in results for row in result['latency']
+        ]),
+        'questions': pd.DataFrame([
+            {'file': result['run']['file'], **row} for result in results for row in result['questions']
+        ]),
+    }
+    paths = []
+    for name, table in tables.items():
+        path = os.path.join(output_dir, f"{name}.parquet")
+        table.to_parquet(path, index=False)
+        paths.append(path)
+    return paths
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize LLM chain traces without the Streamlit UI")
+    parser.add_argument("inputs", nargs='+', help="Trace files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT_DIR, help="Directory for the summary report")
+    parser.add_argument("--format", choices=['json', 'parquet'], default='json', help="Report format")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--recursive", action='store_true', help="Search directories and ** globs recursively")
+    parser.add_argument("--keep-xml", action='store_true', help="Do not skip XML-like tags in records")
+    parser.add_argument("--max-items", type=int, help="Maximum items to process per file")
+    parser.add_argument("--prices", help="JSON file with per-model prices in USD per 1M prompt/completion tokens")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    paths = find_traces(args.inputs, args.recursive)
+    if not paths:
+        print("No trace files found", file=sys.stderr)
+        return 1
+
+    if args.format == 'parquet' and importlib.util.find_spec("pyarrow") is None:
+        print("Parquet reports require pyarrow", file=sys.stderr)
+        return 1
+
+    prices = load_prices(args.prices) if args.prices else None
+    started = time.perf_counter()
+
+    def report(result):
+        run = result['run']
+        if 'error' in run:
+            print(f"FAILED {run['file']}: {run['error']}", file=sys.stderr)
+        else:
+            print(f"{run['file']}: {run['items']} items, {run['questions']} questions in {run['parse_seconds']:.1f}s", file=sys.stderr)
+
+    results = run_batch(paths, args.workers, not args.keep_xml, args.max_items, prices, on_result=report)
+    outputs = write_report(results, args.output, args.format)
+
+    failed = sum('error' in result['run'] for result in results)
+    print(f"Processed {len(results) - failed} of {len(paths)} files in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    for path in outputs:
+        print(path)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
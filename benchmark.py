@@ -0,0 +1,220 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from trace_parser import iter_records
+from trace_index import build_index, extract_questions
+from trace_stats import latency_summary, duration_histogram, slowest_steps, token_usage
+from trace_stats import workflow_groups, timeline_lanes, question_summary
+from documents import PageIndex, read_pages
+from records import StringStore, compact_record
+import trace_cache
+import synthetic
+
+DEFAULT_RESULTS = os.path.join(trace_cache.DEFAULT_CACHE_DIR, "benchmark_results.jsonl")
+REGRESSION_THRESHOLD = 0.10
+MIN_REGRESSION_SECONDS = 0.005
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def measure(fn, repeat=1, memory=True):
+    best = None
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if memory:
+        # A separate traced run, since tracemalloc slows allocation-heavy code.
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+    return result, {'seconds': best, 'peak_mb': peak}
+
+def largest_question(trace):
+    rows = trace.question_rows()
+    return max(range(len(rows)), key=lambda qid: len(rows[qid])) if rows else None
+
+def run_benchmarks(trace_path, report_dir, repeat=1, memory=True, workers=1, full_parse=True):
+    stages = {}
+
+    def stage(name, fn):
+        result, stages[name] = measure(fn, repeat, memory)
+        print(f"{name:>26}: {stages[name]['seconds']:.3f}s"
+              + (f", peak {stages[name]['peak_mb']:.1f} MB" if stages[name]['peak_mb'] is not None else ""),
+              file=sys.stderr)
+        return result
+
+    def parse():
+        with open(trace_path, 'rb') as f:
+            return sum(1 for _ in iter_records(f))
+
+    def questions():
+        with open(trace_path, 'rb') as f:
+            return extract_questions(iter_records(f))
+
+    def compact_questions():
+        store = StringStore()
+        with open(trace_path, 'rb') as f:
+            return extract_questions(compact_record(record, store) for record in iter_records(f))
+
+    stage('parse', parse)
+    if full_parse:
+        stage('extract_questions', questions)
+        stage('extract_questions_compact', compact_questions)
+    trace = stage('build_index', lambda: build_index(trace_path, workers=workers))
+    if workers > 1:
+        stage('build_index_serial', lambda: build_index(trace_path))
+
+    steps = trace.steps
+    qid = largest_question(trace)
+    frame = trace.question_frame(qid)
+    stage('latency_summary', lambda: latency_summary(steps))
+    stage('duration_histogram', lambda: duration_histogram(steps['duration']))
+    stage('slowest_steps', lambda: slowest_steps(steps, trace.question_names))
+    stage('token_usage', lambda: token_usage(steps, by='response_type'))
+    stage('question_summary', lambda: question_summary(steps, trace.sources, trace.question_names))
+    stage('question_frames', lambda: [trace.question_frame(q) for q in range(len(trace.question_names))])
+    stage('workflow_groups', lambda: workflow_groups(frame))
+    stage('timeline_lanes', lambda: timeline_lanes(frame))
+    stage('read_records', lambda: [trace.read_record(row) for row in trace.question_rows()[qid]])
+
+    def load_steps():
+        store = StringStore()
+        return [compact_record(trace.read_record(row), store) for row in trace.question_rows()[qid]]
+
+    stage('load_steps', load_steps)
+
+    if trace_cache.pa is not None:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            stage('cache_save', lambda: trace_cache.save_index('bench', trace, cache_dir))
+            stage('cache_load', lambda: trace_cache.load_index('bench', cache_dir))
+
+    reports = sorted(os.path.join(report_dir, name) for name in os.listdir(report_dir) if name.endswith('.md'))
+
+    def read_documents():
+        return sum(len(read_pages(path)) for path in reports)
+
+    def page_indexes():
+        with tempfile.TemporaryDirectory() as cache_dir:
+            return sum(len(PageIndex.load(path, cache_dir)) for path in reports)
+
+    def fetch_pages():
+        index = PageIndex.load(reports[0], page_cache)
+        return sum(len(index[page]) for page in index)
+
+    with tempfile.TemporaryDirectory() as page_cache:
+        stage('read_markdown_documents', read_documents)
+        stage('page_index_build', page_indexes)
+        stage('page_fetch_all', fetch_pages)
+
+    trace.close()
+    return {
+        'items': len(trace),
+        'questions': len(trace.question_names),
+        'largest_question_steps': len(frame),
+        'stages': stages,
+    }
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(current, previous, threshold=REGRESSION_THRESHOLD):
+    rows = []
+    for name, stats in current['stages'].items():
+        before = previous['stages'].get(name)
+        if not before or not before.get('seconds'):
+            continue
+        change = stats['seconds'] / before['seconds'] - 1
+        slower = stats['seconds'] - before['seconds']
+        rows.append((name, before['seconds'], stats['seconds'], change, change > threshold and slower > MIN_REGRESSION_SECONDS))
+    return rows
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark trace parsing, indexing and statistics")
+    parser.add_argument("--records", type=int, nargs='+', default=[10000], help="Synthetic trace sizes to benchmark")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "chain-analyzer-bench"), help="Where synthetic data is generated and reused")
+    parser.add_argument("--companies", type=int, default=50, help="Number of synthetic reports")
+    parser.add_argument("--pages", type=int, default=200, help="Pages per synthetic report")
+    parser.add_argument("--seed", type=int, default=0, help="Generator seed")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage; the best is kept")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for build_index")
+    parser.add_argument("--no-memory", action='store_true', help="Skip the tracemalloc peak-memory runs")
+    parser.add_argument("--skip-extract", action='store_true', help="Skip extract_questions, which keeps every record in memory")
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSONL file the results are appended to")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Slowdown ratio reported as a regression")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    history = load_results(args.results)
+    regressions = 0
+
+    for records in args.records:
+        data_dir = os.path.join(args.data_dir, f"seed{args.seed}-c{args.companies}-p{args.pages}")
+        trace_path = os.path.join(data_dir, f"trace-{records}.jsonl")
+        report_dir = os.path.join(data_dir, "reports")
+        if not os.path.exists(trace_path) or not os.path.isdir(report_dir):
+            print(f"Generating {records} records in {data_dir}", file=sys.stderr)
+            synthetic.generate(data_dir, records, args.companies, args.pages, seed=args.seed)
+
+        print(f"Benchmarking {trace_path}", file=sys.stderr)
+        config = {
+            'records': records,
+            'companies': args.companies,
+            'pages': args.pages,
+            'seed': args.seed,
+            'workers': args.workers,
+        }
+        result = {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'config': config,
+            **run_benchmarks(trace_path, report_dir, args.repeat, not args.no_memory, args.workers, not args.skip_extract),
+        }
+
+        previous = [r for r in history if r.get('config') == config and r.get('machine') == result['machine']]
+        if previous:
+            print(f"Compared with {previous[-1].get('revision')} ({previous[-1]['timestamp']}):", file=sys.stderr)
+            for name, before, after, change, regressed in compare(result, previous[-1], args.threshold):
+                flag = "  REGRESSION" if regressed else ""
+                print(f"{name:>26}: {before:.3f}s -> {after:.3f}s ({change:+.0%}){flag}", file=sys.stderr)
+                regressions += regressed
+
+        os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+        with open(args.results, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + "\n")
+        history.append(result)
+
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
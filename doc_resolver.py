@@ -0,0 +1,90 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+LEGAL_SUFFIXES = {
+    'ab', 'ag', 'as', 'asa', 'bhd', 'bv', 'co', 'company', 'corp', 'corporation', 'gmbh',
+    'group', 'holding', 'holdings', 'inc', 'incorporated', 'jsc', 'kk', 'llc', 'llp', 'lp',
+    'ltd', 'limited', 'nv', 'oao', 'ojsc', 'oyj', 'pao', 'pjsc', 'plc', 'pte', 'sa', 'sas',
+    'se', 'spa', 'the',
+}
+RESOLVE_MIN_SCORE = 0.45
+MAX_CANDIDATES = 5
+
+def name_tokens(name):
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii').lower()
+    tokens = re.findall(r'[a-z0-9]+', text.replace('&', ' and '))
+    core = [t for t in tokens if t not in LEGAL_SUFFIXES]
+    # A name made only of suffix words ("The Company") keeps them.
+    return core or tokens
+
+def normalize_name(name):
+    return ' '.join(name_tokens(name))
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class DocumentResolver:
+    def __init__(self, documents):
+        self.names = list(documents)
+        self.paths = [documents[name] for name in self.names]
+        self.exact = {}
+        self.normalized = {}
+        self.token_sets = []
+        self.trigram_counts = []
+        self.trigram_index = defaultdict(list)
+
+        for doc_id, name in enumerate(self.names):
+            tokens = name_tokens(name)
+            normalized = ' '.join(tokens)
+            grams = trigrams(normalized)
+
+            self.exact.setdefault(name, doc_id)
+            self.normalized.setdefault(normalized, doc_id)
+            self.token_sets.append(set(tokens))
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.trigram_index[gram].append(doc_id)
+
+    def candidates(self, company_name, limit=MAX_CANDIDATES):
+        if company_name is None or not self.names:
+            return []
+
+        doc_id = self.exact.get(company_name)
+        if doc_id is not None:
+            return [self._candidate(doc_id, 1.0)]
+
+        tokens = name_tokens(company_name)
+        normalized = ' '.join(tokens)
+        doc_id = self.normalized.get(normalized)
+        if doc_id is not None:
+            return [self._candidate(doc_id, 0.99)]
+
+        grams = trigrams(normalized)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.trigram_index.get(gram, ()))
+
+        token_set = set(tokens)
+        scores = []
+        for doc_id, overlap in shared.items():
+            score = 2.0 * overlap / (len(grams) + self.trigram_counts[doc_id])
+            if token_set and token_set <= self.token_sets[doc_id]:
+                score = min(score + 0.2, 0.98)
+            scores.append((score, doc_id))
+
+        scores.sort(key=lambda item: (-item[0], self.names[item[1]]))
+        return [self._candidate(doc_id, score) for score, doc_id in scores[:limit]]
+
+    def resolve(self, company_name, min_score=RESOLVE_MIN_SCORE):
+        candidates = self.candidates(company_name, limit=1)
+        if candidates and candidates[0]['score'] >= min_score:
+            return candidates[0]
+        return None
+
+    def resolve_all(self, company_names, limit=MAX_CANDIDATES):
+        return {name: self.candidates(name, limit) for name in company_names}
+
+    def _candidate(self, doc_id, score):
+        return {'name': self.names[doc_id], 'path': self.paths[doc_id], 'score': score}
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+from documents import read_pages, document_name
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+SNIPPET_TOKENS = 24
+SEARCH_SCHEMA_VERSION = 2
+
+def search_db_path(doc_dir, cache_dir):
+    digest = hashlib.blake2b(os.path.abspath(doc_dir).encode('utf-8'), digest_size=8).hexdigest()
+    return os.path.join(cache_dir, f"doc-search-v{SEARCH_SCHEMA_VERSION}-{digest}.sqlite")
+
+def to_match_query(query):
+    parts = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        if word == 'OR' and parts and parts[-1] != 'OR':
+            parts.append('OR')
+            continue
+        tokens = TOKEN_PATTERN.findall((phrase or word).lower())
+        if tokens:
+            parts.append('"' + ' '.join(tokens) + '"')
+
+    if parts and parts[-1] == 'OR':
+        parts.pop()
+    return ' '.join(parts)
+
+def query_terms(query):
+    return TOKEN_PATTERN.findall(query.lower())
+
+class SearchIndex:
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                path TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                first_row INTEGER NOT NULL,
+                last_row INTEGER NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(
+                path UNINDEXED,
+                name UNINDEXED,
+                page UNINDEXED,
+                content,
+                tokenize = 'unicode61'
+            );
+        """)
+
+    def indexed_documents(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT path, mtime, size FROM documents").fetchall()
+        return {path: (mtime, size) for path, mtime, size in rows}
+
+    def sync(self, documents):
+        indexed = self.indexed_documents()
+        current = {path: name for name, path in documents.items()}
+        changed = []
+
+        for path, name in current.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if indexed.get(path) != (stat.st_mtime, stat.st_size):
+                changed.append((path, name, stat))
+
+        removed = [path for path in indexed if path not in current]
+
+        for path in removed:
+            self.remove_document(path)
+        for path, name, stat in changed:
+            try:
+                pages = read_pages(path)
+            except (OSError, UnicodeDecodeError):
+                continue
+            self.add_document(path, name, stat.st_mtime, stat.st_size, pages)
+
+        return len(changed), len(removed)
+
+    def update(self, paths):
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                pages = read_pages(path)
+            except (OSError, UnicodeDecodeError):
+                self.remove_document(path)
+                continue
+            self.add_document(path, document_name(path), stat.st_mtime, stat.st_size, pages)
+
+    def _delete_pages(self, path):
+        row = self.conn.execute("SELECT first_row, last_row FROM documents WHERE path = ?", (path,)).fetchone()
+        if row:
+            self.conn.execute("DELETE FROM pages WHERE rowid BETWEEN ? AND ?", row)
+
+    def add_document(self, path, name, mtime, size, pages):
+        with self.lock, self.conn:
+            self._delete_pages(path)
+            # Pages of one document get consecutive rowids, so the range is
+            # enough to delete them again without scanning the FTS table.
+            self.conn.executemany(
+                "INSERT INTO pages (path, name, page, content) VALUES (?, ?, ?, ?)",
+                [(path, name, page_num, content) for page_num, content in pages.items()]
+            )
+            last_row = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents (path, name, mtime, size, first_row, last_row) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, name, mtime, size, last_row - len(pages) + 1, last_row)
+            )
+
+    def remove_document(self, path):
+        with self.lock, self.conn:
+            self._delete_pages(path)
+            self.conn.execute("DELETE FROM documents WHERE path = ?", (path,))
+
+    def search(self, query, name=None, limit=50):
+        match = to_match_query(query)
+        if not match:
+            return []
+
+        sql = (
+            "SELECT name, page, bm25(pages), snippet(pages, 3, '<mark>', '</mark>', '…', ?) "
+            "FROM pages WHERE pages MATCH ?"
+        )
+        params = [SNIPPET_TOKENS, match]
+        if name is not None:
+            sql += " AND name = ?"
+            params.append(name)
+        sql += " ORDER BY bm25(pages) LIMIT ?"
+        params.append(limit)
+
+        with self.lock:
+            try:
+                rows = self.conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                return []
+
+        return [
+            {'doc': doc, 'page': int(page), 'score': -score, 'snippet': snippet}
+            for doc, page, score, snippet in rows
+        ]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
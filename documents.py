@@ -0,0 +1,322 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+PAGE_PATTERN = re.compile(r'(?:^|\n)(?:# )?Page (\d+)', re.IGNORECASE)
+PAGE_PATTERN_BYTES = re.compile(rb'(?:^|\n)(?:# )?Page (\d+)', re.IGNORECASE)
+PAGE_INDEX_VERSION = 1
+CATALOG_POLL_INTERVAL = 2.0
+HASH_CHUNK_SIZE = 1024 * 1024
+PAGE_CACHE_CHARS = 64 * 1024 * 1024
+PAGE_STORE_DOCUMENTS = 64
+PREFETCH_WORKERS = 4
+PREFETCH_RADIUS = 2
+
+def split_pages(content):
+    page_matches = list(PAGE_PATTERN.finditer(content))
+
+    if page_matches:
+        pages = {}
+        for i, match in enumerate(page_matches):
+            start_pos = match.end()
+            end_pos = page_matches[i+1].start() if i < len(page_matches)-1 else len(content)
+            page_content = content[start_pos:end_pos].strip()
+            page_num = int(match.group(1))
+            pages[page_num] = page_content
+        return pages
+
+    return {1: content}
+
+def read_pages(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return split_pages(f.read())
+
+def scan_page_offsets(file_path):
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return {1: (0, 0)}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            page_matches = [(int(m.group(1)), m.start(), m.end()) for m in PAGE_PATTERN_BYTES.finditer(mm)]
+
+    if not page_matches:
+        return {1: (0, size)}
+
+    offsets = {}
+    for i, (page_num, _, start_pos) in enumerate(page_matches):
+        end_pos = page_matches[i+1][1] if i < len(page_matches)-1 else size
+        offsets[page_num] = (start_pos, end_pos)
+    return offsets
+
+def page_index_path(file_path, cache_dir):
+    digest = hashlib.blake2b(os.path.abspath(file_path).encode('utf-8'), digest_size=12).hexdigest()
+    return os.path.join(cache_dir, "pages", f"{digest}.json")
+
+class PageIndex(Mapping):
+    def __init__(self, file_path, offsets, page_cache=None, stamp=None):
+        self.file_path = file_path
+        self.offsets = offsets
+        self.page_cache = page_cache
+        self.stamp = stamp
+        self._order = sorted(offsets)
+
+    @classmethod
+    def load(cls, file_path, cache_dir, page_cache=None):
+        stat = os.stat(file_path)
+        sidecar = page_index_path(file_path, cache_dir)
+        try:
+            with open(sidecar, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if (saved['version'], saved['mtime'], saved['size']) == (PAGE_INDEX_VERSION, stat.st_mtime, stat.st_size):
+                offsets = {int(num): tuple(span) for num, span in saved['pages']}
+                return cls(file_path, offsets, page_cache, (stat.st_mtime, stat.st_size))
+        except (OSError, ValueError, KeyError):
+            pass
+
+        offsets = scan_page_offsets(file_path)
+        try:
+            os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+            tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': PAGE_INDEX_VERSION,
+                    'path': os.path.abspath(file_path),
+                    'mtime': stat.st_mtime,
+                    'size': stat.st_size,
+                    'pages': [[num, list(span)] for num, span in offsets.items()],
+                }, f)
+            os.replace(tmp_path, sidecar)
+        except OSError:
+            pass
+        return cls(file_path, offsets, page_cache, (stat.st_mtime, stat.st_size))
+
+    def cache_key(self, page_num):
+        return (self.file_path, self.stamp, page_num)
+
+    def fetch(self, page_nums):
+        pages = {}
+        spans = [(num, self.offsets[num]) for num in page_nums if num in self.offsets]
+        if not spans:
+            return pages
+        # Map per fetch so no handle stays open on the document between reruns.
+        with open(self.file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return {num: "" for num, _ in spans}
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for num, (start, end) in spans:
+                    pages[num] = mm[start:end].decode('utf-8', errors='replace').strip() if end > start else ""
+        if self.page_cache is not None:
+            for num, text in pages.items():
+                self.page_cache.put(self.cache_key(num), text)
+        return pages
+
+    def __getitem__(self, page_num):
+        if page_num not in self.offsets:
+            raise KeyError(page_num)
+        if self.page_cache is not None:
+            text = self.page_cache.get(self.cache_key(page_num))
+            if text is not None:
+                return text
+        return self.fetch([page_num])[page_num]
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, page_num):
+        return page_num in self.offsets
+
+    def keys(self):
+        return list(self._order)
+
+class PageCache:
+    def __init__(self, max_chars=PAGE_CACHE_CHARS):
+        self.max_chars = max_chars
+        self.chars = 0
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.pages
+
+    def get(self, key):
+        with self.lock:
+            text = self.pages.get(key)
+            if text is not None:
+                self.pages.move_to_end(key)
+            return text
+
+    def put(self, key, text):
+        with self.lock:
+            old = self.pages.pop(key, None)
+            if old is not None:
+                self.chars -= len(old)
+            self.pages[key] = text
+            self.chars += len(text)
+            while self.chars > self.max_chars and len(self.pages) > 1:
+                _, evicted = self.pages.popitem(last=False)
+                self.chars -= len(evicted)
+
+def neighbor_pages(pages, radius=PREFETCH_RADIUS):
+    near = set()
+    for page in pages:
+        near.update(range(page - radius, page + radius + 1))
+    return near
+
+class PageStore:
+    def __init__(self, cache_dir, max_documents=PAGE_STORE_DOCUMENTS, max_chars=PAGE_CACHE_CHARS, workers=PREFETCH_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_documents = max_documents
+        self.page_cache = PageCache(max_chars)
+        self.workers = workers
+        self.indexes = OrderedDict()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self._executor = None
+
+    def document(self, file_path):
+        stat = os.stat(file_path)
+        key = (file_path, stat.st_mtime, stat.st_size)
+        with self.lock:
+            index = self.indexes.get(key)
+            if index is not None:
+                self.indexes.move_to_end(key)
+                return index
+
+        index = PageIndex.load(file_path, self.cache_dir, self.page_cache)
+        with self.lock:
+            index = self.indexes.setdefault(key, index)
+            while len(self.indexes) > self.max_documents:
+                self.indexes.popitem(last=False)
+        return index
+
+    def cached(self, file_path, pages):
+        # True when the document is indexed and every requested page it has is
+        # still in the page cache; eviction makes it False again.
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        with self.lock:
+            index = self.indexes.get((file_path, stat.st_mtime, stat.st_size))
+        if index is None:
+            return False
+        return all(index.cache_key(num) in self.page_cache for num in pages if num in index)
+
+    def prefetch(self, file_path, pages=()):
+        if self.cached(file_path, pages):
+            return None
+        with self.lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="page-prefetch")
+            # Consecutive reruns ask for the same pages; queue them once.
+            key = (file_path, frozenset(pages))
+            if key in self.pending:
+                return None
+            self.pending.add(key)
+        return self._executor.submit(self._prefetch, key, file_path, pages)
+
+    def _prefetch(self, key, file_path, pages):
+        try:
+            index = self.document(file_path)
+            missing = [num for num in sorted(pages) if num in index and index.cache_key(num) not in self.page_cache]
+            if missing:
+                index.fetch(missing)
+        except (OSError, ValueError):
+            # Prefetching is best effort; a foreground read reports the error.
+            pass
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+def document_name(path):
+    return os.path.basename(path).replace(".md", "")
+
+def file_digest(path, chunk_size=HASH_CHUNK_SIZE):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+class DocumentCatalog:
+    def __init__(self, doc_dir, poll_interval=CATALOG_POLL_INTERVAL):
+        self.doc_dir = doc_dir
+        self.poll_interval = poll_interval
+        self.entries = {}
+        self.version = 0
+        self.last_poll = None
+        self.lock = threading.Lock()
+        self._documents = {}
+
+    def scan(self):
+        found = {}
+        try:
+            with os.scandir(self.doc_dir) as it:
+                for entry in it:
+                    if entry.name.endswith('.md') and not entry.name.startswith('.') and entry.is_file():
+                        stat = entry.stat()
+                        found[entry.path] = (stat.st_mtime, stat.st_size)
+        except OSError:
+            pass
+        return found
+
+    def poll(self, force=False):
+        changes = {'added': [], 'changed': [], 'removed': []}
+
+        with self.lock:
+            now = time.monotonic()
+            if not force and self.last_poll is not None and now - self.last_poll < self.poll_interval:
+                return changes
+            self.last_poll = now
+
+            found = self.scan()
+            for path, (mtime, size) in found.items():
+                entry = self.entries.get(path)
+                if entry is not None and (entry['mtime'], entry['size']) == (mtime, size):
+                    continue
+                # New files are hashed once as a baseline and known files only
+                # when their stat changes, so a touch that leaves the content
+                # alone is not reported.
+                try:
+                    digest = file_digest(path)
+                except OSError:
+                    continue
+                if entry is None:
+                    self.entries[path] = {'mtime': mtime, 'size': size, 'digest': digest}
+                    changes['added'].append(path)
+                    continue
+                if entry['digest'] != digest:
+                    changes['changed'].append(path)
+                entry.update(mtime=mtime, size=size, digest=digest)
+
+            for path in [p for p in self.entries if p not in found]:
+                del self.entries[path]
+                changes['removed'].append(path)
+
+            if any(changes.values()):
+                self.version += 1
+                self._documents = {document_name(path): path for path in sorted(self.entries)}
+
+        return changes
+
+    def documents(self):
+        return self._documents
+
+    def stat(self, path):
+        entry = self.entries.get(path)
+        return (entry['mtime'], entry['size']) if entry else None
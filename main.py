@@ -1,16 +1,61 @@
 import streamlit as st
+import altair as alt
 import json
 import pandas as pd
 import re
-from collections import defaultdict
+from collections import OrderedDict
 import time
+import threading
 import io
+import tempfile
 import base64
 import os
-import glob
 from pathlib import Path
+import argparse
+
+from trace_stats import latency_summary, duration_histogram, slowest_steps, step_types
+from trace_stats import load_prices, price_table, token_usage, TOKEN_COLUMNS
+from trace_stats import workflow_groups, timeline_lanes, page_ranges, page_hits
+import trace_cache
+from trace_input import find_traces, load_source, compression, trace_root
+from trace_tail import TraceTail
+from trace_sql import TraceDatabase, EXAMPLE_QUERY, QUERY_ROW_LIMIT, SQL_ERRORS, TABLE_COLUMNS, ENGINE as SQL_ENGINE
+from trace_export import export_trace, export_target, select_rows, EXPORT_FORMATS
+import profiling
+from records import json_default
+from documents import PageStore, DocumentCatalog, neighbor_pages
+from doc_search import SearchIndex, search_db_path, query_terms
+from doc_resolver import DocumentResolver, RESOLVE_MIN_SCORE
+from page_grid import page_grid
+from trace_diff import diff_traces, biggest_regressions, question_steps, DIFF_SORT_COLUMNS
 
 DOCUMENT_DIR = r"\Chain-Analyzer\reports"
+LOADED_TRACE_LIMIT = 4
+STEP_PAGE_SIZES = [10, 25, 50, 100]
+STEP_VIEW_CACHE_SIZE = 512
+WORKFLOW_LIST_LIMIT = 200
+HEATMAP_DOCUMENTS = 30
+SQL_DATABASE_LIMIT = 2
+TAIL_POLL_SECONDS = 5
+UPLOAD_TYPES = ["jsonl", "json", "txt", "gz", "bz2", "zst"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="LLM Chain Analysis Tool")
+    parser.add_argument("--trace", help="Trace file, directory or glob on this host to open at startup")
+    parser.add_argument("--trace-root", help="Directory the Server path source may open traces from (default: the directory of --trace)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for parsing large traces")
+    parser.add_argument("--prices", help="JSON file with per-model prices in USD per 1M prompt/completion tokens")
+    parser.add_argument("--cache-dir", default=trace_cache.DEFAULT_CACHE_DIR, help="Directory for the parsed trace cache")
+    parser.add_argument("--cache-limit-gb", type=float, default=trace_cache.CACHE_LIMIT_GB, help="Size above which the least recently used traces are removed from the cache")
+    parser.add_argument("--export-dir", help="Directory the Export Run view may write files to (disabled when unset)")
+    parser.add_argument("--profile", action="store_true", help="Enable the profiling panel by default")
+    args, _ = parser.parse_known_args()
+    return args
+
+ARGS = parse_args()
+# Server paths come from any app user, so they are confined like SQL and
+# export writes. Without a root only uploads are offered.
+TRACE_ROOT = ARGS.trace_root or (trace_root(ARGS.trace) if ARGS.trace else None)
 
 st.set_page_config(
     page_title="LLM Chain Analysis Tool",
@@ -99,43 +144,130 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
+@st.cache_resource(show_spinner=False)
+def get_document_catalog(doc_dir):
+    catalog = DocumentCatalog(doc_dir)
+    catalog.poll(force=True)
+    return catalog
+
 def get_document_list(doc_dir=DOCUMENT_DIR):
-    md_files = glob.glob(os.path.join(doc_dir, "*.md"))
-    return {os.path.basename(f).replace(".md", ""): f for f in md_files}
+    return get_document_catalog(doc_dir).documents()
+
+def refresh_documents(doc_dir, force=False):
+    changes = get_document_catalog(doc_dir).poll(force)
+    touched = changes['added'] + changes['changed'] + changes['removed']
+    search_index = get_search_index(doc_dir, build=False)
+    if touched and search_index is not None:
+        search_index.update(touched)
+    return changes
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_document_resolver(doc_dir, version):
+    return DocumentResolver(get_document_list(doc_dir))
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def get_company_documents(key, doc_dir, version, _trace):
+    resolver = get_document_resolver(doc_dir, version)
+    return resolver.resolve_all(_trace.steps['company_name'].cat.categories)
+
+@st.cache_resource(show_spinner=False)
+def get_page_store():
+    return PageStore(ARGS.cache_dir)
 
-@st.cache_data
 def read_markdown_document(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        page_matches = list(re.finditer(r'(?:^|\n)(?:# )?Page (\d+)', content, re.IGNORECASE))
-        
-        if page_matches:
-            pages = {}
-            for i, match in enumerate(page_matches):
-                start_pos = match.end()
-                end_pos = page_matches[i+1].start() if i < len(page_matches)-1 else len(content)
-                page_content = content[start_pos:end_pos].strip()
-                page_num = int(match.group(1))
-                pages[page_num] = page_content
-            return pages
-        
-        return {1: content}
-            
+        with profiling.span("read_markdown_document", path=file_path):
+            return get_page_store().document(file_path)
     except Exception as e:
         st.error(f"Error reading document: {e}")
         return {}
 
-def display_document_pages(doc_name, pages_dict, analyzed_pages, answer_pages):
+@st.cache_resource
+def get_search_indexes():
+    return {}, threading.Lock()
+
+def get_search_index(doc_dir, build=True):
+    # Indexing a large corpus takes minutes, so it waits for the first
+    # search; until then callers get None and fall back to a page scan.
+    indexes, lock = get_search_indexes()
+    index = indexes.get(doc_dir)
+    if index is not None or not build:
+        return index
+    with lock, st.spinner("Indexing documents for search..."):
+        index = indexes.get(doc_dir)
+        if index is None:
+            index = SearchIndex(search_db_path(doc_dir, ARGS.cache_dir))
+            index.sync(get_document_list(doc_dir))
+            indexes[doc_dir] = index
+    return index
+
+def prefetch_question_documents(key, question_id, doc_dir, trace, frame, sources):
+    # Warm the documents and pages a reviewer is likely to open next while the
+    # current rerun renders; the page viewer then reads from memory. Reruns
+    # only queue documents whose pages are no longer all in the page cache.
+    named = frame.dropna(subset=['company_name'])
+    if not len(named):
+        return
+    version = get_document_catalog(doc_dir).version
+    resolved = get_company_documents(key, doc_dir, version, trace)
+    answer_company = named['company_name'].iloc[-1]
+    answer_pages = set(sources['page_num'].dropna().astype(int))
+    
+    store = get_page_store()
+    for company, rows in named.groupby('company_name', observed=True):
+        candidates = [c for c in resolved.get(company, []) if c['score'] >= RESOLVE_MIN_SCORE]
+        if not candidates:
+            continue
+        pages = set(rows['page_num'].dropna().astype(int))
+        if company == answer_company:
+            pages |= answer_pages
+        store.prefetch(candidates[0]['path'], neighbor_pages(pages))
+
+def highlight_terms(content, query):
+    terms = query_terms(query)
+    if not terms:
+        return content
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(t) for t in sorted(set(terms), key=len, reverse=True)) + r')\b', re.IGNORECASE)
+    return pattern.sub(r'<mark>\1</mark>', content)
+
+def display_document_search(doc_dir):
+    query = st.text_input(
+        "Search all documents:",
+        placeholder='Terms, "exact phrases", OR',
+        key="document_search"
+    )
+    if not query:
+        if get_search_index(doc_dir, build=False) is None:
+            st.caption("The documents are indexed on the first search.")
+        return
+    
+    search_index = get_search_index(doc_dir)
+    start = time.perf_counter()
+    results = search_index.search(query, limit=100)
+    elapsed = (time.perf_counter() - start) * 1000
+    
+    if not results:
+        st.warning(f"No pages found for '{query}'")
+        return
+    
+    st.success(f"Found {len(results)} pages in {elapsed:.1f} ms")
+    for result in results[:20]:
+        st.markdown(f"**{result['doc']}** — Page {result['page']} (score {result['score']:.2f})")
+        st.markdown(f"<div class='detail-container'>{result['snippet']}</div>", unsafe_allow_html=True)
+    
+    labels = [f"{r['doc']} — Page {r['page']}" for r in results]
+    choice = st.selectbox("Open result:", range(len(results)), format_func=lambda i: labels[i], key="document_search_open")
+    result = results[choice]
+    documents = get_document_list(doc_dir)
+    if result['doc'] in documents:
+        pages_dict = read_markdown_document(documents[result['doc']])
+        st.markdown(highlight_terms(pages_dict.get(result['page'], "Page not found"), query), unsafe_allow_html=True)
+
+def display_document_pages(doc_name, pages_dict, analyzed_pages, answer_pages, search_index=None):
     st.subheader(f"Document Pages for {doc_name}")
     
     search_query = st.text_input("Search within document pages:", key=f"page_search_{doc_name}")
     
-    num_pages = len(pages_dict)
-    cols_per_row = 15
-    
     st.write("Click on a page number to view its content:")
     st.write("- 🟢 : Pages used in the final answer")
     st.write("- 🔵 : Pages analyzed but not in final answer")
@@ -154,42 +286,33 @@ def display_document_pages(doc_name, pages_dict, analyzed_pages, answer_pages):
     
     filtered_pages = list(sorted(pages_dict.keys()))
     if search_query:
-        filtered_pages = [
-            page_num for page_num in filtered_pages 
-            if search_query.lower() in pages_dict[page_num].lower()
-        ]
+        if search_index is not None:
+            results = search_index.search(search_query, name=doc_name, limit=len(pages_dict))
+            filtered_pages = [r['page'] for r in results if r['page'] in pages_dict]
+        else:
+            filtered_pages = [
+                page_num for page_num in filtered_pages 
+                if search_query.lower() in pages_dict[page_num].lower()
+            ]
         if filtered_pages:
-            st.success(f"Found {len(filtered_pages)} pages containing '{search_query}'")
+            st.success(f"Found {len(filtered_pages)} pages matching '{search_query}' (best matches first)")
         else:
             st.warning(f"No pages found containing '{search_query}'")
     
-    for i in range(0, len(filtered_pages), cols_per_row):
-        cols = st.columns(cols_per_row)
-        for j in range(cols_per_row):
-            page_idx = i + j
-            if page_idx < len(filtered_pages):
-                page_num = filtered_pages[page_idx]
-                with cols[j]:
-                    if page_num in answer_pages:
-                        label = f"🟢 {page_num}"
-                        btn_type = "primary"
-                    elif page_num in analyzed_pages:
-                        label = f"🔵 {page_num}"
-                        btn_type = "primary"
-                    else:
-                        label = f"{page_num}"
-                        btn_type = "secondary"
-                    
-                    if st.button(label, key=f"page_{doc_name}_{page_num}", type=btn_type):
-                        st.session_state.selected_page = {
-                            'doc': doc_name,
-                            'num': page_num,
-                            'content': pages_dict[page_num]
-                        }
+    selected = st.session_state.get('selected_page')
+    selected_num = selected['num'] if selected and selected['doc'] == doc_name else None
+    clicked = page_grid(filtered_pages, analyzed_pages, answer_pages, selected_num, key=f"page_grid_{doc_name}")
+    if clicked is not None and clicked in pages_dict:
+        st.session_state.selected_page = {
+            'doc': doc_name,
+            'num': clicked,
+            'content': pages_dict[clicked]
+        }
     
     if 'selected_page' in st.session_state and st.session_state.selected_page:
         selected = st.session_state.selected_page
         if selected['doc'] == doc_name:
+            get_page_store().prefetch(pages_dict.file_path, neighbor_pages([selected['num']]))
             st.markdown("---")
             st.subheader(f"Page {selected['num']} Content")
   
@@ -218,107 +341,100 @@ def display_document_pages(doc_name, pages_dict, analyzed_pages, answer_pages):
             with st.container():
                 content = selected['content']
                 if search_query:
-                    content = content.replace(
-                        search_query, 
-                        f"<mark>{search_query}</mark>"
-                    )
+                    content = highlight_terms(content, search_query)
                 st.markdown(content, unsafe_allow_html=True)
 
-@st.cache_data
-def process_file(file_content, max_items=None, skip_xml=True):
-    data = []
-    line_counter = 0
-    in_tag = False
-    json_str = ""
-    bracket_count = 0
+@st.cache_resource
+def get_loaded_traces():
+    return OrderedDict()
+
+def load_trace(key, digest, source, max_items=None, skip_xml=True, workers=1, on_progress=None):
+    loaded = get_loaded_traces()
+    if key in loaded:
+        loaded.move_to_end(key)
+        return loaded[key]
     
-    for line in file_content:
-        line_counter += 1
-        
-        try:
-            line_str = line.decode('utf-8')
-        except UnicodeDecodeError:
+    with profiling.span("cache_load"):
+        index = trace_cache.load_index(key, ARGS.cache_dir)
+    if index is None:
+        with profiling.span("build_index", workers=workers):
+            index = load_source(source, digest, ARGS.cache_dir, skip_xml, max_items, workers, on_progress=on_progress)
+        with profiling.span("cache_save", items=len(index)):
             try:
-                line_str = line.decode('latin-1')
-            except:
-                continue
-        
-        if skip_xml:
-            if "<" in line_str and ">" in line_str:
-                if any(tag in line_str for tag in ["<userStyle>", "<documents>", "<document"]):
-                    in_tag = True
-                    continue
-            
-            if "</" in line_str and ">" in line_str:
-                if any(tag in line_str for tag in ["</userStyle>", "</documents>", "</document>"]):
-                    in_tag = False
-                    continue
-            
-            if in_tag:
-                continue
-        
-        line_str = line_str.strip()
-        if not line_str:
-            continue
-        
-        if line_str.startswith('{') and line_str.endswith('}'):
-            try:
-                obj = json.loads(line_str)
-                data.append(obj)
-                
-                if max_items and len(data) >= max_items:
-                    break
-                    
-                continue
-            except:
-                pass
-        
-        json_str += line_str
-        bracket_count += line_str.count('{') - line_str.count('}')
-        
-        if bracket_count == 0 and json_str:
-            try:
-                obj = json.loads(json_str)
-                data.append(obj)
-                json_str = ""
-                
-                if max_items and len(data) >= max_items:
-                    break
-            except:
-                pass
+                trace_cache.save_index(key, index, ARGS.cache_dir)
+            except OSError as e:
+                st.warning(f"Could not cache the trace index in {ARGS.cache_dir}: {e}")
     
-    return data, line_counter
+    loaded[key] = index
+    if len(loaded) > LOADED_TRACE_LIMIT:
+        loaded.popitem(last=False)
+    # Loaded traces may read their records from a spooled copy, so it stays.
+    trace_cache.prune_cache(ARGS.cache_dir, ARGS.cache_limit_gb * 2**30, keep=[trace_cache.key_digest(k) for k in loaded])
+    return index
+
+@st.cache_resource(max_entries=LOADED_TRACE_LIMIT)
+def get_trace_tail(path, skip_xml):
+    return TraceTail(path, skip_xml)
 
-@st.cache_data
-def extract_questions(data):
-    questions = defaultdict(list)
-    current_question = None
+def watch_trace(path, size):
+    try:
+        current = os.path.getsize(path)
+    except OSError:
+        return
+    if current != size:
+        st.rerun()
+
+def get_upload_digest(uploaded_file):
+    if 'trace_hashes' not in st.session_state:
+        st.session_state.trace_hashes = {}
     
-    for item in data:
-        if 'response_type' not in item:
-            continue
-            
-        if item['response_type'] == 'question_classifier':
-            if 'user_prompt' in item:
-                match = re.search(r'Question:\s*(.*?)(?=\s*\n\s*Provide detailed reasoning|$)', item['user_prompt'], re.DOTALL)
-                if match:
-                    current_question = match.group(1).strip()
-                else:
-                    match = re.search(r'Analyze the following question.*?:\s*\n\s*Question:\s*(.*?)(?=\s*\n|$)', item['user_prompt'], re.DOTALL)
-                    if match:
-                        current_question = match.group(1).strip()
-                    else:
-                        current_question = f"Unknown Question #{len(questions) + 1}"
-        
-        if current_question:
-            questions[current_question].append(item)
-        else:
-            questions["Unclassified Steps"].append(item)
+    digest = st.session_state.trace_hashes.get(uploaded_file.file_id)
+    if digest is None:
+        digest = trace_cache.content_hash(uploaded_file)
+        st.session_state.trace_hashes[uploaded_file.file_id] = digest
     
-    if "Unclassified Steps" in questions and not questions["Unclassified Steps"]:
-        questions.pop("Unclassified Steps")
-        
-    return questions
+    return digest
+
+def get_source_digest(source):
+    if isinstance(source, str):
+        return trace_cache.path_digest(source)
+    return get_upload_digest(source)
+
+def source_name(source):
+    return source if isinstance(source, str) else source.name
+
+def source_size(source):
+    return os.path.getsize(source) if isinstance(source, str) else source.size
+
+def select_trace_source(key_prefix="trace", label="JSONL file", default_path=None):
+    mode = "Upload"
+    if TRACE_ROOT:
+        mode = st.radio(
+            "Trace source:",
+            ["Upload", "Server path"],
+            index=1 if default_path else 0,
+            horizontal=True,
+            key=f"{key_prefix}_source"
+        )
+    if mode == "Upload":
+        return st.file_uploader(f"Upload {label}", type=UPLOAD_TYPES, key=f"{key_prefix}_file")
+    
+    pattern = st.text_input(
+        f"{label} path, directory or glob in {TRACE_ROOT}",
+        value=default_path or "",
+        help="Files on the host running the app, relative to the trace root. .gz, .bz2 and .zst traces are decompressed while they are parsed",
+        key=f"{key_prefix}_path"
+    )
+    if not pattern:
+        return None
+    
+    paths = find_traces([pattern], root=TRACE_ROOT)
+    if not paths:
+        st.warning(f"No trace files found for {pattern} in {TRACE_ROOT}")
+        return None
+    if len(paths) == 1:
+        return paths[0]
+    return st.selectbox(f"{len(paths)} traces found:", paths, key=f"{key_prefix}_choice")
 
 def get_step_name(step):
     response_type = step.get('response_type', 'unknown')
@@ -338,8 +454,40 @@ def get_step_name(step):
     else:
         return f"{response_type.replace('_', ' ').title()}"
 
-def display_step(step, index):
-    response_type = step.get('response_type', 'unknown')
+@st.cache_data(max_entries=STEP_VIEW_CACHE_SIZE, show_spinner=False)
+def get_step_view(key, row, view, _trace):
+    step = _trace.read_record(row)
+    
+    if view == 'raw':
+        return json.dumps(step, indent=2), True
+    
+    if view == 'prompt':
+        return step.get('user_prompt'), False
+    
+    if view == 'timestamp':
+        return step.get('timestamp'), False
+    
+    if 'response' in step and 'choices' in step['response'] and len(step['response']['choices']) > 0:
+        content = step['response']['choices'][0].get('message', {}).get('content', 'No content')
+        
+        try:
+            parsed = json.loads(content)
+            return json.dumps(parsed, indent=2), True
+        except:
+            return content, False
+    
+    return None, False
+
+def step_info(row):
+    return {
+        'response_type': row.response_type if isinstance(row.response_type, str) else 'unknown',
+        'company_name': row.company_name if isinstance(row.company_name, str) else None,
+        'page_num': None if pd.isna(row.page_num) else int(row.page_num),
+        'duration': None if pd.isna(row.duration) else row.duration,
+    }
+
+def display_step(key, trace, row, info, index, expanded=False):
+    response_type = info['response_type']
     
     colors = {
         'question_classifier': '#f9d5e5',
@@ -352,176 +500,691 @@ def display_step(step, index):
     
     color = colors.get(response_type, '#f5f5f5')
     
-    with st.expander(f"Step {index + 1}: {get_step_name(step)}", expanded=False):
+    # Expanders and tabs report whether they are open, so a step's record is
+    # only read and serialized once the user actually looks at it.
+    expander = st.expander(
+        f"Step {index + 1}: {get_step_name(info)}",
+        expanded=expanded,
+        key=f"step_{key}_{row}",
+        on_change="rerun"
+    )
+    if not expander.open:
+        return
+    
+    with expander:
         st.markdown(f"<div style='background-color: {color}; padding: 5px; border-radius: 5px;'>Step type: {response_type}</div>", unsafe_allow_html=True)
         
         col1, col2 = st.columns(2)
         with col1:
-            if 'company_name' in step and step['company_name']:
-                st.info(f"Company: {step['company_name']}")
-            if 'page_num' in step and step['page_num'] is not None:
-                st.info(f"Page: {step['page_num']}")
+            if info['company_name']:
+                st.info(f"Company: {info['company_name']}")
+            if info['page_num'] is not None:
+                st.info(f"Page: {info['page_num']}")
         
         with col2:
-            if 'timestamp' in step:
-                st.info(f"Timestamp: {step['timestamp']}")
-            if 'start_time' in step and 'end_time' in step:
-                duration = step['end_time'] - step['start_time']
-                st.info(f"Duration: {duration:.2f}s")
+            timestamp, _ = get_step_view(key, row, 'timestamp', trace)
+            if timestamp is not None:
+                st.info(f"Timestamp: {timestamp}")
+            if info['duration'] is not None:
+                st.info(f"Duration: {info['duration']:.2f}s")
         
-        prompt_tab, response_tab, raw_tab = st.tabs(["User Prompt", "Response", "Raw JSON"])
+        prompt_tab, response_tab, raw_tab = st.tabs(
+            ["User Prompt", "Response", "Raw JSON"],
+            key=f"step_tabs_{key}_{row}",
+            on_change="rerun"
+        )
         
-        with prompt_tab:
-            if 'user_prompt' in step:
-                st.markdown(f"<div class='user-prompt'>{step['user_prompt']}</div>", unsafe_allow_html=True)
-            else:
-                st.write("No user prompt available")
+        if prompt_tab.open:
+            with prompt_tab:
+                prompt, _ = get_step_view(key, row, 'prompt', trace)
+                if prompt is not None:
+                    st.markdown(f"<div class='user-prompt'>{prompt}</div>", unsafe_allow_html=True)
+                else:
+                    st.write("No user prompt available")
         
-        with response_tab:
-            if 'response' in step and 'choices' in step['response'] and len(step['response']['choices']) > 0:
-                content = step['response']['choices'][0].get('message', {}).get('content', 'No content')
-                
-                try:
-                    parsed = json.loads(content)
-                    st.code(json.dumps(parsed, indent=2), language="json")
-                except:
+        if response_tab.open:
+            with response_tab:
+                content, is_json = get_step_view(key, row, 'response', trace)
+                if content is None:
+                    st.write("No response available")
+                elif is_json:
+                    st.code(content, language="json")
+                else:
                     st.markdown(f"<div class='response-content'>{content}</div>", unsafe_allow_html=True)
-            else:
-                st.write("No response available")
         
-        with raw_tab:
-            st.code(json.dumps(step, indent=2), language="json")
+        if raw_tab.open:
+            with raw_tab:
+                raw, _ = get_step_view(key, row, 'raw', trace)
+                st.code(raw, language="json")
 
-def create_workflow_image(steps):
-    html = """
+WORKFLOW_STYLE = """
+<style>
+    .container {
+        font-family: Arial, sans-serif;
+        padding: 20px;
+        max-width: 1200px;
+        margin: 0 auto;
+    }
+    .workflow {
+        display: flex;
+        flex-direction: column;
+        align-items: center;
+    }
+    .step {
+        margin: 10px;
+        padding: 15px;
+        border-radius: 8px;
+        min-width: 220px;
+        text-align: center;
+        position: relative;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        transition: transform 0.2s, box-shadow 0.2s;
+    }
+    .step:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 4px 8px rgba(0,0,0,0.15);
+    }
+    .step:not(:last-child):after {
+        content: "";
+        position: absolute;
+        bottom: -20px;
+        left: 50%;
+        transform: translateX(-50%);
+        width: 0;
+        height: 0;
+        border-left: 10px solid transparent;
+        border-right: 10px solid transparent;
+        border-top: 10px solid #333;
+    }
+    .question-classifier {
+        background-color: #f9d5e5;
+        border: 1px solid #333;
+    }
+    .company-identifier {
+        background-color: #eeeeee;
+        border: 1px solid #333;
+    }
+    .financial-data {
+        background-color: #e3f2fd;
+        border: 1px solid #333;
+    }
+    .corporate-actions {
+        background-color: #e8f5e9;
+        border: 1px solid #333;
+    }
+    .answer {
+        background-color: #fff9c4;
+        border: 1px solid #333;
+    }
+    .business-operations {
+        background-color: #fff8e1;
+        border: 1px solid #333;
+    }
+    .other {
+        background-color: #f5f5f5;
+        border: 1px solid #333;
+    }
+    .metadata {
+        font-size: 0.8em;
+        color: #555;
+        margin-top: 5px;
+    }
+    details.step summary {
+        cursor: pointer;
+        list-style: none;
+    }
+    details.step summary::-webkit-details-marker {
+        display: none;
+    }
+    .pages {
+        font-size: 0.75em;
+        color: #333;
+        margin-top: 8px;
+        max-height: 120px;
+        overflow-y: auto;
+        text-align: left;
+    }
+</style>
+"""
+
+def workflow_label(response_type):
+    if response_type == 'question_classifier':
+        return 'question-classifier', "Question Classification"
+    elif response_type == 'company_identifier':
+        return 'company-identifier', "Company Identification"
+    elif response_type == 'financial_data':
+        return 'financial-data', "Financial Data"
+    elif response_type == 'corporate_actions':
+        return 'corporate-actions', "Corporate Actions"
+    elif response_type == 'business_operations':
+        return 'business-operations', "Business Operations"
+    elif response_type == 'answer':
+        return 'answer', "Final Answer"
+    else:
+        return 'other', response_type.replace('_', ' ').title()
+
+def workflow_data_uri(nodes):
+    html = f"""
     <!DOCTYPE html>
     <html>
     <head>
-    <style>
-        .container {
-            font-family: Arial, sans-serif;
-            padding: 20px;
-            max-width: 1200px;
-            margin: 0 auto;
-        }
-        .workflow {
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-        }
-        .step {
-            margin: 10px;
-            padding: 15px;
-            border-radius: 8px;
-            min-width: 220px;
-            text-align: center;
-            position: relative;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            transition: transform 0.2s, box-shadow 0.2s;
-        }
-        .step:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 4px 8px rgba(0,0,0,0.15);
-        }
-        .step:not(:last-child):after {
-            content: "";
-            position: absolute;
-            bottom: -20px;
-            left: 50%;
-            transform: translateX(-50%);
-            width: 0;
-            height: 0;
-            border-left: 10px solid transparent;
-            border-right: 10px solid transparent;
-            border-top: 10px solid #333;
-        }
-        .question-classifier {
-            background-color: #f9d5e5;
-            border: 1px solid #333;
-        }
-        .company-identifier {
-            background-color: #eeeeee;
-            border: 1px solid #333;
-        }
-        .financial-data {
-            background-color: #e3f2fd;
-            border: 1px solid #333;
-        }
-        .corporate-actions {
-            background-color: #e8f5e9;
-            border: 1px solid #333;
-        }
-        .answer {
-            background-color: #fff9c4;
-            border: 1px solid #333;
-        }
-        .business-operations {
-            background-color: #fff8e1;
-            border: 1px solid #333;
-        }
-        .other {
-            background-color: #f5f5f5;
-            border: 1px solid #333;
-        }
-        .metadata {
-            font-size: 0.8em;
-            color: #555;
-            margin-top: 5px;
-        }
-    </style>
+    {WORKFLOW_STYLE}
     </head>
     <body>
     <div class="container">
         <div class="workflow">
+    {''.join(nodes)}
+        </div>
+    </div>
+    </body>
+    </html>
     """
     
+    html_bytes = html.encode('utf-8')
+    encoded = base64.b64encode(html_bytes).decode('utf-8')
+    data_uri = f"data:text/html;base64,{encoded}"
+    
+    return data_uri
+
+def create_workflow_image(steps):
+    nodes = []
+    
     for step in steps:
-        response_type = step.get('response_type', 'unknown')
+        class_name, label = workflow_label(step.get('response_type', 'unknown'))
         company_name = step.get('company_name', None)
         page_num = step.get('page_num', None)
         
-        if response_type == 'question_classifier':
-            class_name = 'question-classifier'
-            label = "Question Classification"
-        elif response_type == 'company_identifier':
-            class_name = 'company-identifier'
-            label = "Company Identification"
-        elif response_type == 'financial_data':
-            class_name = 'financial-data'
-            label = f"Financial Data"
-        elif response_type == 'corporate_actions':
-            class_name = 'corporate-actions'
-            label = f"Corporate Actions"
-        elif response_type == 'business_operations':
-            class_name = 'business-operations'
-            label = f"Business Operations"
-        elif response_type == 'answer':
-            class_name = 'answer'
-            label = "Final Answer"
-        else:
-            class_name = 'other'
-            label = response_type.replace('_', ' ').title()
-        
         metadata = ""
         if company_name:
             metadata += f"<div class='metadata'>{company_name}</div>"
         if page_num is not None:
             metadata += f"<div class='metadata'>Page {page_num}</div>"
         
-        html += f'<div class="step {class_name}">{label}{metadata}</div>\n'
+        nodes.append(f'<div class="step {class_name}">{label}{metadata}</div>\n')
     
-    html += """
-        </div>
-    </div>
-    </body>
-    </html>
-    """
+    return workflow_data_uri(nodes)
+
+def create_workflow_groups(groups):
+    nodes = []
     
-    html_bytes = html.encode('utf-8')
-    encoded = base64.b64encode(html_bytes).decode('utf-8')
-    data_uri = f"data:text/html;base64,{encoded}"
+    for group in groups.itertuples():
+        class_name, label = workflow_label(group.response_type)
+        
+        metadata = ""
+        if group.company_name:
+            metadata += f"<div class='metadata'>{group.company_name}</div>"
+        if group.steps > 1:
+            metadata += f"<div class='metadata'>{group.steps} steps, {len(group.pages)} pages</div>"
+        elif group.pages:
+            metadata += f"<div class='metadata'>Page {group.pages[0]}</div>"
+        if not pd.isna(group.wall):
+            metadata += f"<div class='metadata'>{group.wall:.1f}s wall, {group.busy:.1f}s busy</div>"
+        
+        if group.steps > 1:
+            details = f"<div class='pages'>Pages: {page_ranges(group.pages)}<br>Slowest step: {group.slowest:.2f}s</div>"
+            nodes.append(f'<details class="step {class_name}"><summary>{label}{metadata}</summary>{details}</details>\n')
+        else:
+            nodes.append(f'<div class="step {class_name}">{label}{metadata}</div>\n')
     
-    return data_uri
+    return workflow_data_uri(nodes)
+
+def create_workflow_timeline(timeline):
+    lanes = int(timeline['lane'].max()) + 1
+    return alt.Chart(timeline).mark_bar().encode(
+        x=alt.X('start:Q', title="Seconds since first step"),
+        x2='end:Q',
+        y=alt.Y('lane:O', title="Concurrent steps", axis=alt.Axis(labels=lanes <= 50, ticks=lanes <= 50)),
+        color=alt.Color('response_type:N', title="Step type"),
+        tooltip=['step', 'response_type', 'company_name', 'page_num', alt.Tooltip('duration:Q', format='.2f')]
+    ).properties(height=min(max(20 * lanes, 120), 600))
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def get_workflow_groups(key, question_id, step_count, _frame):
+    return workflow_groups(_frame)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def get_workflow_timeline(key, question_id, step_count, _frame):
+    return timeline_lanes(_frame)
+
+def display_workflow(key, question_id, frame):
+    default = "Step list" if len(frame) <= WORKFLOW_LIST_LIMIT else "Grouped"
+    mode = st.radio(
+        "View:",
+        ["Grouped", "Timeline", "Step list"],
+        index=["Grouped", "Timeline", "Step list"].index(default),
+        horizontal=True,
+        key=f"workflow_mode_{key}_{question_id}"
+    )
+    
+    if mode == "Grouped":
+        groups = get_workflow_groups(key, question_id, len(frame), frame)
+        st.caption(f"{len(frame)} steps in {len(groups)} nodes. Expand a node to see its pages.")
+        data_uri = create_workflow_groups(groups)
+        height = min(100 + (110 * len(groups)), 600)
+        st.markdown(f'<iframe src="{data_uri}" width="100%" height="{height}" frameBorder="0"></iframe>', unsafe_allow_html=True)
+    
+    elif mode == "Timeline":
+        timeline = get_workflow_timeline(key, question_id, len(frame), frame)
+        if not len(timeline):
+            st.info("No step timings recorded for this question")
+            return
+        
+        slowest = timeline.loc[timeline['duration'].idxmax()]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Wall Time", f"{timeline['end'].max():.1f}s")
+        col2.metric("Peak Concurrency", int(timeline['lane'].max()) + 1)
+        col3.metric("Slowest Step", f"#{int(slowest['step'])}", f"{slowest['duration']:.2f}s", delta_color="off")
+        st.altair_chart(create_workflow_timeline(timeline))
+    
+    else:
+        if len(frame) > WORKFLOW_LIST_LIMIT:
+            st.info(f"Showing the first {WORKFLOW_LIST_LIMIT} of {len(frame)} steps. Use the grouped view for the whole chain.")
+        shown = frame.iloc[:WORKFLOW_LIST_LIMIT]
+        data_uri = create_workflow_image([step_info(row) for row in shown.itertuples()])
+        height = min(100 + (80 * len(shown)), 600)
+        st.markdown(f'<iframe src="{data_uri}" width="100%" height="{height}" frameBorder="0"></iframe>', unsafe_allow_html=True)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def get_latency_summary(key, _trace):
+    return latency_summary(_trace.steps)
+
+def display_latency_dashboard(key, trace):
+    summary = get_latency_summary(key, trace)
+    if summary.empty:
+        st.info("No timing data available in this trace")
+        return
+    
+    st.subheader("Latency by Step Type (seconds)")
+    st.dataframe(summary.round(2))
+    
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        type_options = ["All step types"] + [t for t in summary.index if t != 'all steps']
+        hist_type = st.selectbox("Histogram for:", type_options, key="latency_hist_type")
+        slowest_count = st.number_input("Slowest steps to list", min_value=5, max_value=500, value=20, step=5)
+    with col2:
+        durations = trace.steps['duration']
+        if hist_type != "All step types":
+            durations = durations[step_types(trace.steps) == hist_type]
+        st.bar_chart(duration_histogram(durations))
+    
+    st.subheader("Slowest Steps")
+    st.caption("Select a row to open its question")
+    slowest = slowest_steps(trace.steps, trace.question_names, slowest_count)
+    event = st.dataframe(
+        slowest,
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key="slowest_steps"
+    )
+    
+    selected_rows = event.selection.rows
+    if selected_rows:
+        question = slowest['question'].iloc[selected_rows[0]]
+        if question and st.session_state.get('latency_jump') != question:
+            st.session_state.latency_jump = question
+            st.session_state.selected_question = question
+
+@st.cache_data(show_spinner=False)
+def get_configured_prices(path):
+    if not path:
+        return None
+    try:
+        return load_prices(path)
+    except (OSError, ValueError) as e:
+        st.error(f"Could not read price table {path}: {e}")
+        return None
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def get_price_table(key, configured, _trace):
+    if not _trace.steps['total_tokens'].notna().any():
+        return None
+    return price_table(_trace.steps, configured).reset_index()
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def get_token_usage(key, group_by, prices, _trace):
+    return token_usage(_trace.steps, group_by, prices, _trace.question_names)
+
+def display_token_dashboard(key, data_key, trace):
+    # Widgets keep the stable key so price edits survive follow-mode refreshes;
+    # the usage tables are cached per trace version and price table.
+    table = get_price_table(data_key, get_configured_prices(ARGS.prices), trace)
+    if table is None:
+        st.info("No token usage found in this trace")
+        return
+    
+    st.subheader("Price Table (USD per 1M tokens)")
+    edited = st.data_editor(
+        table,
+        num_rows="dynamic",
+        hide_index=True,
+        key=f"prices_{key}"
+    )
+    prices = edited.dropna(subset=['model']).set_index('model').fillna(0.0)
+    
+    totals = get_token_usage(data_key, None, prices, trace).iloc[0]
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Prompt Tokens", f"{totals['prompt_tokens']:,.0f}")
+    col2.metric("Completion Tokens", f"{totals['completion_tokens']:,.0f}")
+    col3.metric("Total Tokens", f"{totals['total_tokens']:,.0f}")
+    col4.metric("Completion Tokens/s", f"{totals['completion_tok_per_s']:.1f}")
+    col5.metric("Estimated Cost", f"${totals['cost']:,.2f}")
+    
+    group_by = st.radio(
+        "Group token usage by:",
+        ["response_type", "company_name", "question_id"],
+        format_func=lambda x: {"response_type": "Step type", "company_name": "Company", "question_id": "Question"}[x],
+        horizontal=True,
+        key="token_group_by"
+    )
+    usage = get_token_usage(data_key, group_by, prices, trace)
+    st.dataframe(usage.round({**{c: 0 for c in TOKEN_COLUMNS}, 'cost': 4, 'completion_tok_per_s': 1, 'total_tok_per_s': 1}))
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def get_page_hits(key, _trace):
+    return page_hits(_trace.steps, _trace.sources)
+
+def create_page_heatmap(hits, metric):
+    documents = hits['document'].nunique()
+    return alt.Chart(hits).mark_rect().encode(
+        x=alt.X('page_num:O', title="Page", axis=alt.Axis(labelOverlap=True)),
+        y=alt.Y('document:N', title=None, sort='-color'),
+        color=alt.Color(f'{metric}:Q', title=metric.title(), scale=alt.Scale(scheme='orangered')),
+        tooltip=['document', 'company_name', 'page_num', 'analyzed', 'questions', 'cited']
+    ).properties(height=min(max(22 * documents, 120), 800))
+
+def display_page_heatmap(key, trace, doc_dir):
+    hits = get_page_hits(key, trace)
+    if not len(hits):
+        st.info("No document pages were analyzed in this trace")
+        return
+    
+    version = get_document_catalog(doc_dir).version
+    resolved = get_company_documents(key, doc_dir, version, trace)
+    names = {
+        company: next((c['name'] for c in candidates if c['score'] >= RESOLVE_MIN_SCORE), company)
+        for company, candidates in resolved.items()
+    }
+    hits = hits.assign(
+        company_name=hits['company_name'].astype(str),
+        document=hits['company_name'].astype(str).map(names)
+    )
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Pages Read", f"{len(hits):,}")
+    col2.metric("Page Reads", f"{hits['analyzed'].sum():,}")
+    col3.metric("Page Citations", f"{hits['cited'].sum():,}")
+    
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        metric = st.radio(
+            "Color by:",
+            ['analyzed', 'questions', 'cited'],
+            format_func={'analyzed': "Times analyzed", 'questions': "Questions analyzing", 'cited': "Times cited"}.get,
+            horizontal=True,
+            key="heatmap_metric"
+        )
+    with col2:
+        document_count = st.number_input("Documents to show", min_value=1, max_value=500, value=HEATMAP_DOCUMENTS, step=5)
+    
+    top_documents = hits.groupby('document')[metric].sum().nlargest(document_count).index
+    st.altair_chart(create_page_heatmap(hits[hits['document'].isin(top_documents)], metric))
+    
+    st.subheader("Most Re-read Pages")
+    st.dataframe(
+        hits.nlargest(50, 'analyzed')[['document', 'page_num', 'analyzed', 'questions', 'cited']],
+        hide_index=True
+    )
+
+@st.cache_resource
+def get_trace_databases():
+    return OrderedDict()
+
+def get_trace_database(key, trace):
+    databases = get_trace_databases()
+    database = databases.get(key)
+    if database is not None:
+        databases.move_to_end(key)
+        return database
+    
+    database = databases[key] = TraceDatabase(trace)
+    while len(databases) > SQL_DATABASE_LIMIT:
+        databases.popitem(last=False)[1].close()
+    return database
+
+def run_sql_query(key, trace, sql):
+    try:
+        started = time.perf_counter()
+        with profiling.span("sql_query"):
+            result, truncated = get_trace_database(key, trace).query(sql)
+        return {'key': key, 'sql': sql, 'result': result, 'truncated': truncated, 'elapsed': time.perf_counter() - started}
+    except SQL_ERRORS as e:
+        return {'key': key, 'sql': sql, 'error': str(e)}
+
+def display_sql_console(key, trace):
+    st.caption(
+        f"{SQL_ENGINE} over tables: " +
+        "; ".join(f"**{name}** ({', '.join(columns)})" for name, columns in TABLE_COLUMNS.items())
+    )
+    
+    with st.form("sql_console"):
+        sql = st.text_area("Query", value=st.session_state.get('sql_query', EXAMPLE_QUERY), height=140)
+        submitted = st.form_submit_button("Run query")
+    
+    # Queries run only on submit; other reruns show the stored result, so a
+    # slow query never holds up paging, tab switches or follow-mode refreshes.
+    # Loading the tables also waits for the first query, since the SQLite
+    # fallback copies the whole trace.
+    if submitted:
+        st.session_state.sql_query = sql
+        with st.spinner("Running query..."):
+            st.session_state.sql_result = run_sql_query(key, trace, sql)
+    
+    last = st.session_state.get('sql_result')
+    if not last:
+        return
+    if 'error' in last:
+        st.error(f"Query failed: {last['error']}")
+        return
+    
+    shown = f"first {QUERY_ROW_LIMIT:,}" if last['truncated'] else f"{len(last['result']):,}"
+    st.caption(f"Showing {shown} rows in {last['elapsed'] * 1000:.0f} ms")
+    if last['key'] != key:
+        st.caption("The trace has changed since this query ran. Run it again to refresh the result.")
+    st.dataframe(last['result'], hide_index=True)
+    
+    last_sql = last['sql']
+    st.download_button(
+        "Export full result as CSV",
+        data=lambda: get_trace_database(key, trace).query(last_sql, limit=None)[0].to_csv(index=False),
+        file_name="query-result.csv",
+        mime="text/csv",
+        on_click="ignore"
+    )
+
+EXPORT_MIME_TYPES = {'parquet': "application/vnd.apache.parquet", 'ndjson': "application/x-ndjson", 'csv': "text/csv"}
+
+def export_download(trace, fmt, rows=None, include_prompts=False):
+    # The export streams to an anonymous file in the cache directory, which
+    # is removed once Streamlit has read it for the browser.
+    export_dir = os.path.join(ARGS.cache_dir, "exports")
+    os.makedirs(export_dir, exist_ok=True)
+    spool = tempfile.TemporaryFile(dir=export_dir)
+    with profiling.span("export", format=fmt, rows=len(trace) if rows is None else len(rows)):
+        export_trace(trace, spool, fmt, rows, include_prompts)
+    spool.seek(0)
+    return spool
+
+def display_export(key, trace):
+    st.caption("Steps are written with timing, token usage, the parsed response and cited pages as flat columns.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        fmt = st.radio("Format:", list(EXPORT_FORMATS), format_func=EXPORT_FORMATS.get, horizontal=True, key="export_format")
+        include_prompts = st.checkbox("Include user prompts", value=False, key="export_prompts")
+    with col2:
+        types = [str(t) for t in trace.steps['response_type'].cat.categories]
+        selected_types = st.multiselect("Step types:", types, default=types, key="export_types")
+    
+    rows = None
+    if len(selected_types) < len(types):
+        rows = select_rows(trace, response_types=selected_types)
+    st.caption(f"{len(trace) if rows is None else len(rows):,} steps selected")
+    
+    st.download_button(
+        f"Download {EXPORT_FORMATS[fmt]}",
+        data=lambda: export_download(trace, fmt, rows, include_prompts),
+        file_name=f"chain-run.{fmt}",
+        mime=EXPORT_MIME_TYPES[fmt],
+        on_click="ignore"
+    )
+    st.caption(
+        "The export is written in batches to a temporary file, but Streamlit loads the finished file "
+        "into memory to send it to the browser. Write large runs to the export directory instead."
+    )
+    
+    if not ARGS.export_dir:
+        st.caption("Start the app with --export-dir to write exports on the server.")
+        return
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        export_name = st.text_input(
+            f"Or write to a file in {ARGS.export_dir}",
+            placeholder=f"run.{fmt}",
+            help="Written in batches, so whole runs export without being held in memory"
+        )
+    with col2:
+        st.write("")
+        write_clicked = st.button("Write export", disabled=not export_name)
+    if write_clicked:
+        try:
+            target = export_target(ARGS.export_dir, export_name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with st.spinner("Exporting..."), profiling.span("export", format=fmt, path=target):
+                count = export_trace(trace, target, fmt, rows, include_prompts)
+            st.success(f"Wrote {count:,} steps to {target}")
+        except (OSError, ImportError, ValueError) as e:
+            st.error(f"Export failed: {e}")
+
+@st.cache_data(max_entries=2, show_spinner="Comparing traces...")
+def get_trace_diff(base_key, new_key, _base, _new):
+    return diff_traces(_base, _new)
+
+def display_trace_diff(key, trace, skip_xml, max_items, workers):
+    st.caption("Questions are matched on their text. Steps are matched on type, company and page.")
+    base_source = select_trace_source("baseline", "baseline JSONL file")
+    if base_source is None:
+        return
+    
+    base_digest = get_source_digest(base_source)
+    base_key = trace_cache.trace_key(base_digest, skip_xml, max_items)
+    with profiling.span("load_trace", baseline=True):
+        base = load_trace(base_key, base_digest, base_source, max_items, skip_xml, workers)
+    with profiling.span("trace_diff"):
+        questions, steps = get_trace_diff(base_key, key, base, trace)
+    
+    matched = questions[questions['status'] == 'matched']
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Matched Questions", len(matched))
+    col2.metric("New Questions", int((questions['status'] == 'added').sum()))
+    col3.metric("Dropped Questions", int((questions['status'] == 'removed').sum()))
+    col4.metric("Wall Time Change", f"{matched['wall_new'].sum() - matched['wall_base'].sum():+,.1f}s")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        sort_by = st.selectbox(
+            "Rank questions by:",
+            list(DIFF_SORT_COLUMNS),
+            format_func=DIFF_SORT_COLUMNS.get,
+            key="diff_sort_by"
+        )
+    with col2:
+        count = st.number_input("Questions to list", min_value=10, max_value=5000, value=100, step=10)
+    
+    st.subheader("Biggest Regressions")
+    st.caption("Select a row to compare its steps")
+    ranked = biggest_regressions(questions, sort_by, count)
+    columns = [
+        'question', 'status', 'wall_base', 'wall_new', 'wall_delta', 'busy_delta', 'tokens_delta',
+        'steps_added', 'steps_removed', 'slowest_step_delta',
+        'analyzed_added', 'analyzed_removed', 'cited_added', 'cited_removed'
+    ]
+    event = st.dataframe(
+        ranked[columns].round(2),
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key="diff_regressions"
+    )
+    
+    selected_rows = event.selection.rows
+    if not selected_rows:
+        return
+    
+    selected = ranked.iloc[selected_rows[0]]
+    aligned = question_steps(steps, selected['key'])
+    st.markdown(f"**{selected['question']}**: {len(aligned)} aligned steps")
+    status = st.multiselect("Show steps:", ['added', 'removed', 'matched'], default=['added', 'removed'], key="diff_step_status")
+    aligned = aligned[aligned['status'].isin(status)]
+    st.dataframe(
+        aligned[[
+            'status', 'response_type', 'company_name', 'page_num', 'occurrence',
+            'duration_base', 'duration_new', 'duration_delta', 'tokens_delta'
+        ]].sort_values('duration_delta', ascending=False, na_position='last').round(2),
+        hide_index=True
+    )
+
+def display_profiling_panel(history):
+    with st.sidebar.expander("🧪 Profiling", expanded=st.session_state.profile_enabled):
+        st.checkbox("Profile reruns", key="profile_enabled", help="Time every stage and tab on each rerun")
+        st.checkbox(
+            "Track Python allocations",
+            key="profile_memory",
+            help="Records peak memory per stage with tracemalloc, which slows allocation-heavy stages down"
+        )
+        
+        if not history:
+            st.caption("Enable profiling to time the next rerun")
+            return
+        
+        profiler = history[-1]
+        peak = f", peak RSS {profiler.peak_rss:.0f} MB" if profiler.peak_rss is not None else ""
+        st.caption(f"Rerun {profiler.run_id}: {profiler.total * 1000:.0f} ms{peak}")
+        
+        summary = pd.DataFrame.from_dict(profiler.summary(), orient='index')
+        if len(summary):
+            summary = summary.sort_values('total_ms', ascending=False)
+            if summary['peak_mb'].isna().all():
+                summary = summary.drop(columns=['peak_mb'])
+            st.dataframe(summary.round(1))
+        
+        st.download_button(
+            f"Export Chrome trace ({len(history)} reruns)",
+            data=lambda: profiling.chrome_trace(list(history)),
+            file_name="chain-analyzer-trace.json",
+            mime="application/json",
+            on_click="ignore"
+        )
+
+def make_progress_reporter(progress_bar, preview, total_bytes):
+    def report(bytes_read, item_count, question_names):
+        if total_bytes is None:
+            # Compressed input: only the decompressed byte count is known.
+            progress_bar.progress(0, text=f"Indexed {item_count} items ({bytes_read / 1e6:.1f} MB decompressed)")
+        else:
+            fraction = min(bytes_read / total_bytes, 1.0) if total_bytes else 1.0
+            progress_bar.progress(fraction, text=f"Indexed {item_count} items ({bytes_read / 1e6:.1f} / {total_bytes / 1e6:.1f} MB)")
+        
+        if question_names:
+            latest = question_names[-5:]
+            preview.markdown(
+                f"**{len(question_names)} questions found so far**\n\n" +
+                "\n".join(f"- {q[:80]}" for q in latest)
+            )
+    
+    return report
 
 def main():
     if 'selected_page' not in st.session_state:
@@ -556,12 +1219,27 @@ def main():
         )
         
         if st.button("Refresh Document List"):
-            st.cache_data.clear()
-            st.success("Document list refreshed!")
+            with profiling.span("refresh_documents", force=True):
+                changes = refresh_documents(doc_dir, force=True)
+            st.success(
+                f"Document list refreshed: {len(changes['added'])} added, "
+                f"{len(changes['changed'])} changed, {len(changes['removed'])} removed"
+            )
+        else:
+            with profiling.span("refresh_documents"):
+                refresh_documents(doc_dir)
+        
+        st.caption(f"{len(get_document_list(doc_dir))} documents in catalog")
     
-    uploaded_file = st.file_uploader("Upload JSONL file", type=["jsonl", "json", "txt"])
+    with st.expander("🔎 Search Documents", expanded=False), profiling.span("document_search"):
+        if os.path.isdir(doc_dir):
+            display_document_search(doc_dir)
+        else:
+            st.info(f"Document directory not found: {doc_dir}")
+    
+    source = select_trace_source(default_path=ARGS.trace)
     
-    if uploaded_file is not None:
+    if source is not None:
         st.sidebar.header("🔄 Processing Options")
         
         with st.sidebar.expander("File Processing Options", expanded=True):
@@ -571,24 +1249,59 @@ def main():
             max_items = None
             if limit_items:
                 max_items = st.number_input("Maximum items to process", min_value=10, value=1000, step=100)
+            
+            workers = st.number_input(
+                "Parser worker processes",
+                min_value=1,
+                max_value=max(os.cpu_count() or 1, ARGS.workers),
+                value=ARGS.workers,
+                help="Files larger than 32 MB are split into shards and parsed in parallel"
+            )
+            
+            follow = False
+            if isinstance(source, str) and not compression(source):
+                follow = st.checkbox(
+                    "Follow file",
+                    value=False,
+                    help="Parse lines appended to the trace as it grows and refresh the views. The item limit does not apply"
+                )
+                if follow:
+                    poll_seconds = st.number_input("Check for new lines every (s)", min_value=1, value=TAIL_POLL_SECONDS)
         
         progress_bar = st.progress(0)
+        preview = st.empty()
         
         with st.spinner("Processing file..."):
-            file_content = uploaded_file.getvalue()
-            uploaded_file.seek(0)
-            
-            for i in range(10):
-                progress_bar.progress((i + 1) * 10)
-                time.sleep(0.05)
-            
-            data, line_count = process_file(uploaded_file, max_items, skip_xml)
+            size = source_size(source)
+            if follow:
+                tail = get_trace_tail(source, skip_xml)
+                on_progress = make_progress_reporter(progress_bar, preview, size)
+                with profiling.span("tail_refresh"):
+                    added = tail.refresh(on_progress=on_progress)
+                trace, key = tail.index, tail.key
+                # Rows only ever get appended, so single steps stay cached under the
+                # stable key while run-wide views are rebuilt per version.
+                data_key = f"{key}-v{tail.version}"
+            else:
+                with profiling.span("source_digest", bytes=size):
+                    digest = get_source_digest(source)
+                key = trace_cache.trace_key(digest, skip_xml, max_items)
+                total_bytes = None if compression(source_name(source)) else size
+                on_progress = make_progress_reporter(progress_bar, preview, total_bytes)
+                with profiling.span("load_trace"):
+                    trace = load_trace(key, digest, source, max_items, skip_xml, workers, on_progress=on_progress)
+                data_key = key
             progress_bar.progress(100)
+            preview.empty()
+        
+        if follow:
+            st.caption(f"Following {source}: {added} new items, {len(trace.question_names)} questions so far")
+            st.fragment(watch_trace, run_every=poll_seconds)(source, tail.size)
         
-        if data:
-            st.success(f"Successfully processed {len(data)} items from {line_count} lines")
+        if len(trace):
+            st.success(f"Successfully processed {len(trace)} items from {trace.line_count} lines")
             
-            questions = extract_questions(data)
+            questions = trace.questions()
             
             st.subheader("📊 Questions Analyzed")
             if not questions:
@@ -598,11 +1311,29 @@ def main():
             with st.container():
                 st.markdown('<div class="metrics-container">', unsafe_allow_html=True)
                 col1, col2, col3 = st.columns(3)
-                col1.metric("Total Items", len(data))
+                col1.metric("Total Items", len(trace))
                 col2.metric("Questions Found", len(questions))
                 col3.metric("Total Question Steps", sum(len(steps) for steps in questions.values()))
                 st.markdown('</div>', unsafe_allow_html=True)
             
+            with st.expander("⏱️ Run Latency Dashboard", expanded=False), profiling.span("latency_dashboard"):
+                display_latency_dashboard(data_key, trace)
+            
+            with st.expander("💰 Token Usage & Cost", expanded=False), profiling.span("token_dashboard"):
+                display_token_dashboard(key, data_key, trace)
+            
+            with st.expander("🗺️ Page Hit Heatmap", expanded=False), profiling.span("page_heatmap"):
+                display_page_heatmap(data_key, trace, doc_dir)
+            
+            with st.expander("🧮 SQL Console", expanded=False), profiling.span("sql_console"):
+                display_sql_console(data_key, trace)
+            
+            with st.expander("📦 Export Run", expanded=False), profiling.span("export_view"):
+                display_export(key, trace)
+            
+            with st.expander("🔀 Compare with Baseline Run", expanded=False), profiling.span("trace_diff_view"):
+                display_trace_diff(data_key, trace, skip_xml, max_items, workers)
+            
             st.markdown('<div class="search-box">', unsafe_allow_html=True)
             search_term = st.text_input("Search questions:", placeholder="Type to filter questions...")
             st.markdown('</div>', unsafe_allow_html=True)
@@ -619,15 +1350,22 @@ def main():
             selected_question = st.selectbox(
                 "Select a question to analyze:", 
                 filtered_questions,
-                format_func=lambda x: f"{x[:80]}..." if len(x) > 80 else x
+                format_func=lambda x: f"{x[:80]}..." if len(x) > 80 else x,
+                key="selected_question"
             )
             
             if selected_question:
                 steps = questions[selected_question]
+                with profiling.span("question_frame", steps=len(steps)):
+                    frame = trace.question_frame(steps.question_id)
+                    sources = trace.question_sources(steps.question_id)
+                with profiling.span("prefetch_documents"):
+                    prefetch_question_documents(data_key, steps.question_id, doc_dir, trace, frame, sources)
                 st.markdown(f"## Analysis for: {selected_question}")
                 st.markdown(f"**Number of steps:** {len(steps)}")
                 
-                response_types = pd.Series([step.get('response_type') for step in steps if 'response_type' in step]).value_counts()
+                response_types = frame['response_type'].value_counts()
+                response_types = response_types[response_types > 0]
                 
                 tab1, tab2, tab3, tab4, tab5 = st.tabs([
                     "Step Details", 
@@ -637,8 +1375,8 @@ def main():
                     "Raw Data"
                 ])
                 
-                with tab1:
-                    step_types = list(set([step.get('response_type') for step in steps if 'response_type' in step]))
+                with tab1, profiling.span("tab: Step Details"):
+                    step_types = list(response_types.index)
                     selected_types = st.multiselect(
                         "Filter by step type:",
                         options=step_types,
@@ -646,76 +1384,79 @@ def main():
                         format_func=lambda x: x.replace('_', ' ').title()
                     )
                     
-                    filtered_steps = steps
+                    filtered_frame = frame
                     if selected_types and len(selected_types) < len(step_types):
-                        filtered_steps = [step for step in steps if step.get('response_type') in selected_types]
-                        st.info(f"Showing {len(filtered_steps)} of {len(steps)} steps")
+                        filtered_frame = frame[frame['response_type'].isin(selected_types).to_numpy()]
+                        st.info(f"Showing {len(filtered_frame)} of {len(steps)} steps")
+                    
+                    col1, col2, col3 = st.columns([2, 1, 1])
+                    with col1:
+                        expand_all = st.checkbox("Expand all steps", value=False)
+                    with col2:
+                        page_size = st.selectbox("Steps per page", STEP_PAGE_SIZES, index=1)
+                    with col3:
+                        page_count = max(1, -(-len(filtered_frame) // page_size))
+                        step_page = st.number_input("Page", min_value=1, max_value=page_count, value=1)
                     
-                    expand_all = st.checkbox("Expand all steps", value=False)
+                    first = (step_page - 1) * page_size
+                    page_frame = filtered_frame.iloc[first:first + page_size]
+                    if page_count > 1:
+                        st.caption(f"Steps {first + 1}-{first + len(page_frame)} of {len(filtered_frame)}")
                     
-                    for i, step in enumerate(filtered_steps):
-                        display_step(step, i)
+                    for i, row in enumerate(page_frame.itertuples()):
+                        display_step(key, trace, row.Index, step_info(row), first + i, expand_all)
                 
-                with tab2:
+                with tab2, profiling.span("tab: Workflow Visualization"):
                     with st.container():
                         st.markdown('<div class="workflow-section">', unsafe_allow_html=True)
                         st.subheader("Workflow Visualization")
                         
-                        data_uri = create_workflow_image(steps)
-                        height = min(100 + (80 * len(steps)), 600)
-                        st.markdown(f'<iframe src="{data_uri}" width="100%" height="{height}" frameBorder="0"></iframe>', unsafe_allow_html=True)
+                        display_workflow(key, steps.question_id, frame)
                         st.markdown('</div>', unsafe_allow_html=True)
                     
                     st.subheader("Company Analysis")
-                    companies = set([step.get('company_name') for step in steps if step.get('company_name')])
+                    company_frame = frame[frame['company_name'].notna()]
+                    step_counts = company_frame.groupby('company_name', observed=True).size()
+                    company_pages = (
+                        company_frame.dropna(subset=['page_num'])
+                        .sort_values('page_num')
+                        .groupby('company_name', observed=True)['page_num']
+                        .agg(lambda pages: ', '.join(map(str, pages)))
+                    )
                     
-                    if companies:
-                        for company in companies:
-                            company_steps = [step for step in steps if step.get('company_name') == company]
-                            st.write(f"**{company}**: {len(company_steps)} steps")
-                            
-                            pages = [step.get('page_num') for step in company_steps if step.get('page_num') is not None]
-                            if pages:
-                                st.write(f"Pages analyzed: {', '.join([str(p) for p in sorted(pages)])}")
+                    for company, count in step_counts.items():
+                        st.write(f"**{company}**: {count} steps")
+                        if company in company_pages.index:
+                            st.write(f"Pages analyzed: {company_pages[company]}")
                 
-                with tab3:
-                    company_name = None
-                    analyzed_pages = set()
-                    answer_pages = set()
-                    
-                    for step in steps:
-                        if 'company_name' in step and step['company_name']:
-                            company_name = step['company_name']
-                        
-                        if 'page_num' in step and step['page_num'] is not None:
-                            analyzed_pages.add(step['page_num'])
-                    
-                    for step in steps:
-                        if step.get('response_type') == 'answer' and 'response' in step:
-                            try:
-                                sources = step['response']['choices'][0]['message']['parsed'].get('sources', [])
-                                for source in sources:
-                                    if 'page_number' in source:
-                                        page_num = source['page_number']
-                                        answer_pages.add(page_num)
-                            except (KeyError, IndexError, AttributeError):
-                                pass
+                with tab3, profiling.span("tab: Document Pages"):
+                    named = frame['company_name'].dropna()
+                    company_name = named.iloc[-1] if len(named) else None
+                    analyzed_pages = set(frame['page_num'].dropna().astype(int).unique())
+                    answer_pages = set(sources['page_num'].dropna().astype(int).unique())
                     
                     if company_name:
                         documents = get_document_list(doc_dir)
+                        version = get_document_catalog(doc_dir).version
+                        candidates = get_company_documents(data_key, doc_dir, version, trace).get(company_name)
+                        if candidates is None:
+                            candidates = get_document_resolver(doc_dir, version).candidates(company_name)
+                        candidates = [c for c in candidates if c['score'] >= RESOLVE_MIN_SCORE]
                         
                         doc_path = None
                         doc_name = None
                         
-                        if company_name in documents:
-                            doc_path = documents[company_name]
-                            doc_name = company_name
-                        else:
-                            for name, path in documents.items():
-                                if company_name.lower() in name.lower():
-                                    doc_path = path
-                                    doc_name = name
-                                    break
+                        if len(candidates) == 1:
+                            doc_name = candidates[0]['name']
+                            doc_path = candidates[0]['path']
+                        elif candidates:
+                            scores = {c['name']: c['score'] for c in candidates}
+                            doc_name = st.selectbox(
+                                f"Documents matching {company_name}:",
+                                options=list(scores),
+                                format_func=lambda x: f"{x} ({scores[x]:.0%} match)"
+                            )
+                            doc_path = documents.get(doc_name)
                         
                         if not doc_path:
                             st.warning(f"No document found for {company_name}. Please select one manually:")
@@ -734,7 +1475,7 @@ def main():
                             pages_dict = read_markdown_document(doc_path)
                             
                             if pages_dict:
-                                display_document_pages(doc_name, pages_dict, analyzed_pages, answer_pages)
+                                display_document_pages(doc_name, pages_dict, analyzed_pages, answer_pages, get_search_index(doc_dir, build=False))
                             else:
                                 st.error(f"No pages found in document: {doc_name}")
                         else:
@@ -742,7 +1483,7 @@ def main():
                     else:
                         st.info("No company identified in the analysis")
                 
-                with tab4:
+                with tab4, profiling.span("tab: Statistics"):
                     st.subheader("Step Type Distribution")
                     st.bar_chart(response_types)
                     
@@ -750,19 +1491,10 @@ def main():
                     
                     with col1:
                         st.subheader("Step Timing")
-                        has_timing = any(['start_time' in step and 'end_time' in step for step in steps])
+                        timed = frame[frame['duration'].notna()]
                         
-                        if has_timing:
-                            timing_data = {}
-                            for step in steps:
-                                if 'start_time' in step and 'end_time' in step:
-                                    response_type = step.get('response_type', 'unknown')
-                                    duration = step['end_time'] - step['start_time']
-                                    if response_type not in timing_data:
-                                        timing_data[response_type] = []
-                                    timing_data[response_type].append(duration)
-                            
-                            avg_durations = {k: sum(v)/len(v) for k, v in timing_data.items()}
+                        if len(timed):
+                            avg_durations = timed.groupby(timed['response_type'].astype(object).fillna('unknown'))['duration'].mean()
                             df = pd.DataFrame({'Average Duration (s)': avg_durations})
                             st.bar_chart(df)
                         else:
@@ -778,53 +1510,56 @@ def main():
                                 usage_ratio = len(answer_pages) / len(analyzed_pages) * 100
                                 st.metric("Page Usage Efficiency", f"{usage_ratio:.1f}%")
                 
-                with tab5:
+                with tab5, profiling.span("tab: Raw Data"):
                     st.subheader("Raw Data")
                     
-                    download_options = st.radio(
+                    file_stem = selected_question[:50].replace('?', '')
+                    download_format = st.radio(
                         "Download format:",
-                        ["JSON", "CSV (if possible)"]
+                        ["JSON", *EXPORT_FORMATS.values()],
+                        horizontal=True
                     )
                     
-                    if download_options == "JSON":
-                        if st.button("Download JSON"):
-                            json_str = json.dumps(steps, indent=2)
-                            st.download_button(
-                                "Download JSON file",
-                                json_str,
-                                file_name=f"{selected_question[:50].replace('?', '')}.json",
-                                mime="application/json"
-                            )
+                    if download_format == "JSON":
+                        st.download_button(
+                            "Download JSON file",
+                            data=lambda: json.dumps(list(steps), indent=2, default=json_default),
+                            file_name=f"{file_stem}.json",
+                            mime="application/json",
+                            on_click="ignore"
+                        )
                     else:
-                        try:
-                            flat_data = []
-                            for step in steps:
-                                flat_step = {
-                                    'response_type': step.get('response_type', ''),
-                                    'company_name': step.get('company_name', ''),
-                                    'page_num': step.get('page_num', ''),
-                                }
-                                flat_data.append(flat_step)
-                            
-                            df = pd.DataFrame(flat_data)
-                            csv = df.to_csv(index=False)
-                            
-                            st.download_button(
-                                "Download CSV file",
-                                csv,
-                                file_name=f"{selected_question[:50].replace('?', '')}.csv",
-                                mime="text/csv"
-                            )
-                        except Exception as e:
-                            st.error(f"Could not convert to CSV: {e}")
-                            st.info("Try downloading as JSON instead")
+                        fmt = next(name for name, label in EXPORT_FORMATS.items() if label == download_format)
+                        st.download_button(
+                            f"Download {download_format} file",
+                            data=lambda: export_download(trace, fmt, steps.rows),
+                            file_name=f"{file_stem}.{fmt}",
+                            mime=EXPORT_MIME_TYPES[fmt],
+                            on_click="ignore"
+                        )
                     
-                    with st.expander("View Raw JSON"):
-                        st.code(json.dumps(steps, indent=2), language="json")
+                    if st.toggle("View raw JSON", key=f"raw_json_{key}_{steps.question_id}"):
+                        st.code(json.dumps(list(steps), indent=2, default=json_default), language="json")
         else:
             st.error("No valid JSON objects found in the file")
 
+def run():
+    st.session_state.setdefault('profile_enabled', ARGS.profile)
+    st.session_state.setdefault('profile_memory', False)
+    history = st.session_state.setdefault('profile_history', profiling.new_history())
+    st.session_state.profile_run = st.session_state.get('profile_run', 0) + 1
+    
+    if st.session_state.profile_enabled:
+        profiling.start_run(True, st.session_state.profile_run, st.session_state.profile_memory)
+    try:
+        with profiling.span("main"):
+            main()
+    finally:
+        profiling.finish_run(history)
+    
+    display_profiling_panel(history)
+
 if __name__ == "__main__":
-    main()
+    run()
     
  
\ No newline at end of file
@@ -0,0 +1,94 @@
+import streamlit as st
+
+PAGE_GRID_CSS = """
+.page-grid {
+    display: grid;
+    grid-template-columns: repeat(auto-fill, minmax(2.6em, 1fr));
+    gap: 3px;
+    font-family: var(--st-font, sans-serif);
+    font-size: 0.75em;
+}
+.page-cell {
+    height: 2.2em;
+    line-height: 2.2em;
+    text-align: center;
+    border-radius: 3px;
+    cursor: pointer;
+    color: var(--st-text-color, #31333f);
+    background-color: var(--st-secondary-background-color, #f0f2f6);
+    user-select: none;
+}
+.page-cell:hover {
+    outline: 1px solid var(--st-primary-color, #ff4b4b);
+}
+.page-cell.analyzed {
+    color: white;
+    background-color: #1f77b4;
+}
+.page-cell.answer {
+    color: white;
+    background-color: #2ca02c;
+}
+.page-cell.selected {
+    outline: 2px solid var(--st-primary-color, #ff4b4b);
+    font-weight: bold;
+}
+"""
+
+PAGE_GRID_JS = """
+export default function(component) {
+    const { data, setTriggerValue, parentElement } = component;
+    let grid = parentElement.querySelector('.page-grid');
+    if (!grid) {
+        grid = document.createElement('div');
+        grid.className = 'page-grid';
+        parentElement.appendChild(grid);
+    }
+
+    const answer = new Set(data.answer);
+    const analyzed = new Set(data.analyzed);
+    const cells = data.pages.map((page) => {
+        let cls = 'page-cell';
+        let title = `Page ${page}`;
+        if (answer.has(page)) {
+            cls += ' answer';
+            title += ': used in the final answer';
+        } else if (analyzed.has(page)) {
+            cls += ' analyzed';
+            title += ': analyzed';
+        }
+        if (page === data.selected) {
+            cls += ' selected';
+        }
+        return `<div class="${cls}" data-page="${page}" title="${title}">${page}</div>`;
+    });
+    grid.innerHTML = cells.join('');
+
+    grid.onclick = (event) => {
+        const cell = event.target.closest('[data-page]');
+        if (!cell) {
+            return;
+        }
+        grid.querySelectorAll('.selected').forEach((el) => el.classList.remove('selected'));
+        cell.classList.add('selected');
+        setTriggerValue('clicked', Number(cell.dataset.page));
+    };
+}
+"""
+
+_page_grid = st.components.v2.component("page_grid", css=PAGE_GRID_CSS, js=PAGE_GRID_JS)
+
+def page_grid(pages, analyzed_pages, answer_pages, selected=None, key=None):
+    pages = [int(p) for p in pages]
+    shown = set(pages)
+    result = _page_grid(
+        key=key,
+        data={
+            'pages': pages,
+            'analyzed': sorted(int(p) for p in analyzed_pages if p in shown),
+            'answer': sorted(int(p) for p in answer_pages if p in shown),
+            'selected': selected,
+        },
+        on_clicked_change=lambda: None
+    )
+    return result.clicked
@@ -0,0 +1,147 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PROFILE_HISTORY = 20
+NOOP = nullcontext()
+
+_local = threading.local()
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+class Span:
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.profiler.enter()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.profiler.record(self.name, self.start, end, self.profiler.leave(), self.args)
+        return False
+
+class Profiler:
+    def __init__(self, run_id, trace_memory=False):
+        self.run_id = run_id
+        self.trace_memory = trace_memory
+        self.origin = time.perf_counter()
+        self.wall_origin = time.time()
+        self.events = []
+        self.peaks = []
+        self.tid = threading.get_ident()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def span(self, name, **args):
+        return Span(self, name, args)
+
+    def enter(self):
+        if self.trace_memory:
+            # tracemalloc keeps a single peak; the parent's peak so far is
+            # saved before resetting it for the child and merged back after.
+            if self.peaks:
+                self.peaks[-1] = max(self.peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.peaks.append(0)
+
+    def leave(self):
+        if not self.trace_memory:
+            return None
+        peak = max(self.peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if self.peaks:
+            self.peaks[-1] = max(self.peaks[-1], peak)
+        return peak
+
+    def record(self, name, start, end, peak, args):
+        self.events.append({
+            'name': name,
+            'start': start - self.origin,
+            'duration': end - start,
+            'peak': peak,
+            'args': args,
+        })
+
+    def finish(self):
+        self.total = time.perf_counter() - self.origin
+        self.peak_rss = peak_rss_mb()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def summary(self):
+        stages = {}
+        for event in self.events:
+            stage = stages.setdefault(event['name'], {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'peak_mb': None})
+            stage['calls'] += 1
+            stage['total_ms'] += event['duration'] * 1000
+            stage['max_ms'] = max(stage['max_ms'], event['duration'] * 1000)
+            if event['peak'] is not None:
+                stage['peak_mb'] = max(stage['peak_mb'] or 0.0, event['peak'] / 2**20)
+        return stages
+
+    def trace_events(self):
+        pid = os.getpid()
+        events = [{
+            'name': f"rerun {self.run_id}", 'cat': 'rerun', 'ph': 'X', 'pid': pid, 'tid': self.tid,
+            'ts': self.wall_origin * 1e6, 'dur': self.total * 1e6,
+            'args': {'peak_rss_mb': self.peak_rss},
+        }]
+        for event in self.events:
+            args = dict(event['args'])
+            if event['peak'] is not None:
+                args['peak_mb'] = event['peak'] / 2**20
+            events.append({
+                'name': event['name'], 'cat': 'stage', 'ph': 'X', 'pid': pid, 'tid': self.tid,
+                'ts': (self.wall_origin + event['start']) * 1e6, 'dur': event['duration'] * 1e6,
+                'args': args,
+            })
+        return events
+
+def start_run(enabled, run_id=0, trace_memory=False):
+    _local.profiler = Profiler(run_id, trace_memory) if enabled else None
+    return _local.profiler
+
+def current():
+    return getattr(_local, 'profiler', None)
+
+def span(name, **args):
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is None:
+        return NOOP
+    return profiler.span(name, **args)
+
+def finish_run(history=None):
+    profiler = getattr(_local, 'profiler', None)
+    _local.profiler = None
+    if profiler is None:
+        return None
+    profiler.finish()
+    if history is not None:
+        history.append(profiler)
+    return profiler
+
+def new_history():
+    return deque(maxlen=PROFILE_HISTORY)
+
+def chrome_trace(profilers):
+    events = [event for profiler in profilers for event in profiler.trace_events()]
+    return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
@@ -0,0 +1,121 @@
+import json
+from collections.abc import Mapping
+
+from trace_parser import json_loads
+
+STEP_FIELDS = (
+    'response_type', 'company_name', 'page_num', 'user_prompt', 'response',
+    'start_time', 'end_time', 'timestamp',
+)
+STEP_FIELD_SET = frozenset(STEP_FIELDS)
+# Nested fields are kept as compact JSON text and decoded on access; the
+# containers of a parsed response take several times the size of its text.
+PACKED_FIELDS = frozenset(['response'])
+# Short strings are cheap to duplicate and dict keys are already shared by
+# the JSON decoder, so only long text such as prompts and page content is
+# worth a lookup.
+INTERN_MIN_CHARS = 64
+
+MISSING = object()
+
+class StringStore:
+    def __init__(self, min_chars=INTERN_MIN_CHARS):
+        self.strings = {}
+        self.min_chars = min_chars
+        self.chars = 0
+        self.hits = 0
+        self.saved_chars = 0
+
+    def intern(self, value):
+        if len(value) < self.min_chars:
+            return value
+        stored = self.strings.get(value)
+        if stored is not None:
+            if stored is not value:
+                self.hits += 1
+                self.saved_chars += len(value)
+            return stored
+
+        self.strings[value] = value
+        self.chars += len(value)
+        return value
+
+    def clear(self):
+        # Records already holding references keep them; clearing only means
+        # later duplicates stop sharing with strings seen before the reset.
+        self.strings = {}
+        self.chars = 0
+
+    def __len__(self):
+        return len(self.strings)
+
+def pack_value(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+def compact_value(value, store):
+    if type(value) is str:
+        return store.intern(value)
+    if type(value) is dict:
+        return {k: compact_value(v, store) for k, v in value.items()}
+    if type(value) is list:
+        return [compact_value(v, store) for v in value]
+    return value
+
+class StepRecord(Mapping):
+    __slots__ = STEP_FIELDS + ('extra',)
+
+    def __init__(self, data, store):
+        for name in STEP_FIELDS:
+            if name not in data:
+                setattr(self, name, MISSING)
+            elif name in PACKED_FIELDS:
+                setattr(self, name, store.intern(pack_value(data[name])))
+            else:
+                setattr(self, name, compact_value(data[name], store))
+
+        extra = {
+            key: compact_value(value, store)
+            for key, value in data.items() if key not in STEP_FIELD_SET
+        }
+        self.extra = extra or None
+
+    def __getitem__(self, key):
+        if key in STEP_FIELD_SET:
+            value = getattr(self, key)
+            if value is MISSING:
+                raise KeyError(key)
+            return json_loads(value) if key in PACKED_FIELDS else value
+        if self.extra is not None:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in STEP_FIELD_SET:
+            return getattr(self, key) is not MISSING
+        return self.extra is not None and key in self.extra
+
+    def __iter__(self):
+        for name in STEP_FIELDS:
+            if getattr(self, name) is not MISSING:
+                yield name
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        return {key: self[key] for key in self}
+
+    def __repr__(self):
+        return f"StepRecord({self.to_dict()!r})"
+
+def compact_record(obj, store):
+    if type(obj) is not dict:
+        return obj
+    return StepRecord(obj, store)
+
+def json_default(value):
+    if isinstance(value, StepRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import random
+import sys
+
+COMPANY_WORDS = [
+    'Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark', 'Wayne', 'Wonka', 'Cyberdyne', 'Soylent',
+    'Tyrell', 'Aperture', 'Vandelay', 'Gringotts', 'Oscorp', 'Massive', 'Dynamic', 'Northern', 'Pacific', 'Atlas',
+]
+COMPANY_SUFFIXES = ['Corp', 'Inc.', 'LLC', 'PLC', 'Group', 'Holdings', 'AG', 'SA']
+PAGE_STEP_TYPES = ['financial_data', 'corporate_actions', 'business_operations']
+METRICS = ['revenue', 'net income', 'operating margin', 'free cash flow', 'dividend per share', 'headcount']
+TOPICS = [
+    'Revenue for the segment was {value} million, up {change}% year over year.',
+    'The board approved a dividend of {value} cents per share and a buyback program.',
+    'Operating expenses grew to {value} million driven by research and development.',
+    'The company completed the acquisition of a regional competitor for {value} million.',
+    'Net debt decreased by {change}% following the issuance of new notes.',
+    'Headcount reached {value} employees across {change} countries.',
+]
+PROMPT_TEMPLATE = (
+    "You are a financial analyst. Read the page below and extract facts relevant to the question.\n\n"
+    "Question: {question}\n\nPage {page} of the {company} annual report.\n"
+)
+CLASSIFIER_TEMPLATE = (
+    "Analyze the following question and classify it:\n"
+    "Question: {question}\n"
+    "Provide detailed reasoning for your classification."
+)
+MODELS = ['gpt-4o-mini', 'gpt-4o']
+
+def company_names(count, rng):
+    names = []
+    seen = set()
+    while len(names) < count:
+        name = f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}"
+        if len(seen) >= len(COMPANY_WORDS) ** 2 * len(COMPANY_SUFFIXES):
+            name = f"{name} {len(names)}"
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+def write_reports(report_dir, companies, pages, seed=0):
+    os.makedirs(report_dir, exist_ok=True)
+    for i, company in enumerate(companies):
+        rng = random.Random(f"{seed}-report-{i}")
+        path = os.path.join(report_dir, f"{company}.md")
+        with open(path, 'w', encoding='utf-8') as f:
+            for page in range(1, pages + 1):
+                f.write(f"# Page {page}\n\n")
+                for _ in range(rng.randint(3, 8)):
+                    f.write(rng.choice(TOPICS).format(value=rng.randint(1, 9999), change=rng.randint(1, 40)))
+                    f.write("\n\n")
+
+def make_step(rng, clock, response_type, user_prompt, content, duration, model, company_name=None, page_num=None, parsed=None):
+    prompt_tokens = len(user_prompt) // 4 + rng.randint(50, 400)
+    completion_tokens = rng.randint(20, 600)
+    step = {
+        'response_type': response_type,
+        'user_prompt': user_prompt,
+        'response': {
+            'model': model,
+            'choices': [{'message': {'content': content, 'parsed': parsed or {}}}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        },
+        'start_time': round(clock, 3),
+        'end_time': round(clock + duration, 3),
+        'timestamp': f"2024-01-01T{int(clock // 3600) % 24:02d}:{int(clock // 60) % 60:02d}:{int(clock) % 60:02d}",
+    }
+    if company_name is not None:
+        step['company_name'] = company_name
+    if page_num is not None:
+        step['page_num'] = page_num
+    return step
+
+def question_steps(rng, number, companies, pages, max_pages, concurrency, clock):
+    company = rng.choice(companies)
+    question = f"What was the {rng.choice(METRICS)} of {company} in {rng.randint(2015, 2024)}? (#{number})"
+    model = rng.choice(MODELS)
+
+    duration = rng.uniform(0.5, 2.0)
+    yield make_step(rng, clock, 'question_classifier', CLASSIFIER_TEMPLATE.format(question=question),
+                    json.dumps({'category': 'financial', 'confidence': round(rng.random(), 2)}), duration, model)
+    clock += duration
+
+    duration = rng.uniform(0.3, 1.5)
+    yield make_step(rng, clock, 'company_identifier', f"Identify the company in: {question}",
+                    json.dumps({'company_name': company}), duration, model, company_name=company)
+    clock += duration
+
+    analyzed = rng.sample(range(1, pages + 1), rng.randint(1, min(max_pages, pages)))
+    # Page steps run in waves of `concurrency`, with a long tail of stragglers.
+    for wave in range(0, len(analyzed), concurrency):
+        wave_end = clock
+        for page in analyzed[wave:wave + concurrency]:
+            for response_type in PAGE_STEP_TYPES:
+                start = clock + rng.uniform(0, 0.2)
+                duration = rng.lognormvariate(0.5, 0.6)
+                content = json.dumps({'relevant': rng.random() < 0.3, 'facts': [rng.choice(TOPICS)[:60]]})
+                prompt = PROMPT_TEMPLATE.format(question=question, page=page, company=company)
+                yield make_step(rng, start, response_type, prompt, content, duration, model, company_name=company, page_num=page)
+                wave_end = max(wave_end, start + duration)
+        clock = wave_end
+
+    sources = [{'page_number': page} for page in rng.sample(analyzed, min(len(analyzed), rng.randint(1, 3)))]
+    duration = rng.uniform(1.0, 4.0)
+    yield make_step(rng, clock, 'answer', f"Answer the question using the extracted facts: {question}",
+                    json.dumps({'answer': 'See sources', 'sources': sources}), duration, model,
+                    company_name=company, parsed={'answer': 'See sources', 'sources': sources})
+
+def write_trace(path, records, companies, pages, max_pages=40, concurrency=8, seed=0, pretty_every=0):
+    rng = random.Random(f"{seed}-trace")
+    clock = 0.0
+    written = 0
+    number = 0
+
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < records:
+            number += 1
+            for step in question_steps(rng, number, companies, pages, max_pages, concurrency, clock):
+                if pretty_every and written % pretty_every == pretty_every - 1:
+                    f.write(json.dumps(step, indent=2))
+                else:
+                    f.write(json.dumps(step))
+                f.write("\n")
+                written += 1
+                clock = max(clock, step['end_time'])
+                if written >= records:
+                    break
+            clock += rng.uniform(0.0, 5.0)
+
+    return written, number
+
+def generate(output_dir, records, companies=50, pages=200, max_pages=40, concurrency=8, seed=0, pretty_every=0):
+    rng = random.Random(f"{seed}-companies")
+    names = company_names(companies, rng)
+    report_dir = os.path.join(output_dir, "reports")
+    trace_path = os.path.join(output_dir, f"trace-{records}.jsonl")
+
+    os.makedirs(output_dir, exist_ok=True)
+    write_reports(report_dir, names, pages, seed)
+    written, questions = write_trace(trace_path, records, names, pages, max_pages, concurrency, seed, pretty_every)
+    return trace_path, report_dir, written, questions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic chain traces and reports")
+    parser.add_argument("output", help="Output directory")
+    parser.add_argument("--records", type=int, default=10000, help="Number of trace records")
+    parser.add_argument("--companies", type=int, default=50, help="Number of companies and report files")
+    parser.add_argument("--pages", type=int, default=200, help="Pages per report")
+    parser.add_argument("--max-pages", type=int, default=40, help="Maximum pages analyzed per question")
+    parser.add_argument("--concurrency", type=int, default=8, help="Pages analyzed in parallel per question")
+    parser.add_argument("--pretty-every", type=int, default=0, help="Write every Nth record as multi-line JSON")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    trace_path, report_dir, written, questions = generate(
+        args.output, args.records, args.companies, args.pages, args.max_pages,
+        args.concurrency, args.seed, args.pretty_every
+    )
+    print(f"Wrote {written} records for {questions} questions to {trace_path}", file=sys.stderr)
+    print(f"Wrote {args.companies} reports of {args.pages} pages to {report_dir}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
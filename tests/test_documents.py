@@ -0,0 +1,44 @@
+import os
+
+from documents import PageStore, DocumentCatalog
+
+def write_document(path, count=10):
+    path.write_text("".join(f"# Page {num}\nText of page {num}.\n" for num in range(1, count + 1)), encoding='utf-8')
+    return str(path)
+
+def test_prefetch_skips_cached_pages(tmp_path):
+    doc = write_document(tmp_path / "report.md")
+    store = PageStore(str(tmp_path / "cache"))
+
+    store.prefetch(doc, {1, 2, 3}).result()
+    index = store.document(doc)
+    assert all(index.cache_key(num) in store.page_cache for num in (1, 2, 3))
+    assert store.prefetch(doc, {1, 2, 3}) is None
+    # Pages the document lacks do not count as missing.
+    assert store.prefetch(doc, {2, 99}) is None
+
+def test_prefetch_runs_again_after_eviction(tmp_path):
+    doc = write_document(tmp_path / "report.md")
+    store = PageStore(str(tmp_path / "cache"), max_chars=40)
+
+    store.prefetch(doc, {1}).result()
+    store.prefetch(doc, {5, 6}).result()
+    index = store.document(doc)
+    assert index.cache_key(1) not in store.page_cache
+
+    store.prefetch(doc, {1}).result()
+    assert index.cache_key(1) in store.page_cache
+
+def test_catalog_ignores_touches(tmp_path):
+    doc = write_document(tmp_path / "report.md")
+    catalog = DocumentCatalog(str(tmp_path))
+    assert catalog.poll(force=True)['added'] == [doc]
+    version = catalog.version
+
+    os.utime(doc, (1000, 1000))
+    assert not any(catalog.poll(force=True).values())
+    assert catalog.version == version
+
+    write_document(tmp_path / "report.md", count=11)
+    assert catalog.poll(force=True)['changed'] == [doc]
+    assert catalog.version == version + 1
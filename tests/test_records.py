@@ -0,0 +1,65 @@
+import json
+import tracemalloc
+
+from records import StringStore, compact_record, INTERN_MIN_CHARS
+
+PROMPT = "Read the attached annual report pages and extract the requested figure. " * 30
+
+def raw_lines(count=300):
+    for i in range(count):
+        yield json.dumps({
+            'response_type': 'page_analysis',
+            'company_name': f"Company {i % 5}",
+            'page_num': i,
+            'user_prompt': PROMPT,
+            'response': {'choices': [{'message': {'parsed': {'value': i, 'pages': [i, i + 1]}}}]},
+            'start_time': float(i),
+            'end_time': i + 1.5,
+        })
+
+def traced_size(build):
+    # Each record is decoded from its own line, as when read from a trace, so
+    # equal strings start out as separate objects.
+    lines = list(raw_lines())
+    tracemalloc.start()
+    try:
+        records = build(lines)
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert len(records) == len(lines)
+    return size
+
+def test_compact_records_use_a_fraction_of_the_memory():
+    plain = traced_size(lambda lines: [json.loads(line) for line in lines])
+    store = StringStore()
+    compact = traced_size(lambda lines: [compact_record(json.loads(line), store) for line in lines])
+
+    assert compact * 4 < plain
+
+def test_compact_record_reads_like_the_source():
+    obj = json.loads(next(raw_lines()))
+    record = compact_record(obj, StringStore())
+
+    assert record.to_dict() == obj
+    assert record['response']['choices'][0]['message']['parsed']['value'] == 0
+    assert 'extra' not in record
+
+def test_store_skips_short_strings():
+    store = StringStore()
+    short = "x" * (INTERN_MIN_CHARS - 1)
+    long = "y" * INTERN_MIN_CHARS
+
+    assert store.intern(short) is short
+    assert store.intern("".join(long)) is store.intern(long)
+    assert len(store) == 1
+    assert store.chars == INTERN_MIN_CHARS
+
+def test_clear_keeps_existing_references():
+    store = StringStore()
+    first = store.intern("".join(["z"] * 100))
+    store.clear()
+
+    assert len(store) == 0 and store.chars == 0
+    assert first == "z" * 100
+    assert store.intern("".join(["z"] * 100)) is not first
@@ -0,0 +1,69 @@
+import os
+
+import trace_cache
+import synthetic
+
+def write_entry(cache_dir, digest, size, mtime, spooled=True):
+    paths = [trace_cache.cache_path(f"{digest}-v4-x1-n0", str(cache_dir))]
+    if spooled:
+        paths.append(trace_cache.source_path(digest, str(cache_dir)))
+    for path in paths:
+        with open(path, 'wb') as f:
+            f.write(b"x" * (size // len(paths)))
+        os.utime(path, (mtime, mtime))
+    return paths
+
+def test_prune_removes_least_recently_used_entries(tmp_path):
+    old = write_entry(tmp_path, "a" * 32, 100, 1000)
+    local = write_entry(tmp_path, "b" * 32, 100, 2000, spooled=False)
+    new = write_entry(tmp_path, "c" * 32, 100, 3000)
+
+    removed = trace_cache.prune_cache(str(tmp_path), max_bytes=100)
+
+    assert removed == ["a" * 32, "b" * 32]
+    assert not any(os.path.exists(path) for path in old + local)
+    assert all(os.path.exists(path) for path in new)
+
+def test_prune_keeps_entries_in_use(tmp_path):
+    old = write_entry(tmp_path, "a" * 32, 100, 1000)
+    write_entry(tmp_path, "b" * 32, 100, 2000)
+    write_entry(tmp_path, "c" * 32, 100, 3000)
+
+    removed = trace_cache.prune_cache(str(tmp_path), max_bytes=100, keep=["a" * 32])
+
+    assert removed == ["b" * 32, "c" * 32]
+    assert all(os.path.getmtime(path) > 3000 for path in old)
+
+def test_prune_ignores_other_files(tmp_path):
+    results = tmp_path / "benchmark_results.jsonl"
+    results.write_text("{}\n")
+    (tmp_path / "pages").mkdir()
+
+    assert trace_cache.prune_cache(str(tmp_path), max_bytes=0) == []
+    assert results.exists()
+
+def test_load_trace_leaves_local_trace_untouched(tmp_path, monkeypatch):
+    import main
+
+    trace_path = str(tmp_path / "run.jsonl")
+    synthetic.write_trace(trace_path, 200, ["Alpha", "Beta"], 20)
+    os.utime(trace_path, (1000, 1000))
+    digest = trace_cache.path_digest(trace_path)
+    key = trace_cache.trace_key(digest)
+
+    monkeypatch.setattr(main.ARGS, 'cache_dir', str(tmp_path / "cache"))
+    monkeypatch.setattr(main.ARGS, 'cache_limit_gb', 0)
+    main.get_loaded_traces().clear()
+    try:
+        first = main.load_trace(key, digest, trace_path)
+        main.get_loaded_traces().clear()
+        second = main.load_trace(key, digest, trace_path)
+    finally:
+        main.get_loaded_traces().clear()
+
+    assert os.path.getmtime(trace_path) == 1000
+    assert trace_cache.path_digest(trace_path) == digest
+    assert len(second) == len(first) == 200
+    if trace_cache.pa is not None:
+        # The index in use survives pruning and serves the second load.
+        assert os.path.exists(trace_cache.cache_path(key, main.ARGS.cache_dir))
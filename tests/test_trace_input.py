@@ -0,0 +1,32 @@
+import os
+
+from trace_input import find_traces, trace_root
+
+def make_tree(tmp_path):
+    root = tmp_path / "traces"
+    (root / "nested").mkdir(parents=True)
+    (root / "run.jsonl").write_text("{}\n")
+    (root / "nested" / "other.jsonl").write_text("{}\n")
+    outside = tmp_path / "secret.jsonl"
+    outside.write_text("{}\n")
+    os.symlink(outside, root / "link.jsonl")
+    return str(root), str(outside)
+
+def test_trace_root_is_the_fixed_prefix(tmp_path):
+    root, _ = make_tree(tmp_path)
+
+    assert trace_root(root) == root
+    assert trace_root(os.path.join(root, "run.jsonl")) == root
+    assert trace_root(os.path.join(root, "*", "*.jsonl")) == root
+
+def test_find_traces_stays_inside_root(tmp_path):
+    root, outside = make_tree(tmp_path)
+
+    assert find_traces(["run.jsonl"], root=root) == [os.path.join(root, "run.jsonl")]
+    assert find_traces(["**/*.jsonl"], recursive=True, root=root) == [
+        os.path.join(root, "nested", "other.jsonl"), os.path.join(root, "run.jsonl"),
+    ]
+    assert find_traces([outside], root=root) == []
+    assert find_traces(["../secret.jsonl"], root=root) == []
+    assert find_traces(["nested/../../secret.jsonl"], root=root) == []
+    assert find_traces(["link.jsonl"], root=root) == []
@@ -0,0 +1,98 @@
+import io
+import json
+
+import pytest
+
+import trace_parser
+from trace_parser import iter_record_spans, iter_records, iter_parallel, parse_range, find_shard_bounds
+
+def pretty(obj):
+    return json.dumps(obj, indent=2).encode('utf-8') + b"\n"
+
+def compact(obj):
+    return json.dumps(obj).encode('utf-8') + b"\n"
+
+def sample_trace(count=30):
+    parts = [b"INFO pipeline started\n"]
+    expected = []
+    for i in range(count):
+        obj = {'id': i, 'response_type': 'answer', 'nested': {'page': i, 'items': [1, 2]}}
+        expected.append(obj)
+        parts.append(pretty(obj) if i % 3 == 0 else compact(obj))
+        if i % 7 == 0:
+            parts.append(b"WARN retrying request {id}\n")
+        if i % 10 == 5:
+            parts.append(b"<documents>\n{\"hidden\": true}\n</documents>\n")
+    return b"".join(parts), expected
+
+def test_stray_lines_do_not_swallow_later_records():
+    data, expected = sample_trace()
+    stats = {}
+    state = {}
+    records = list(iter_records(io.BytesIO(data), stats=stats))
+    list(iter_record_spans(io.BytesIO(data), state=state))
+
+    assert records == expected
+    assert trace_parser.is_clean(state)
+
+def test_spans_point_at_records():
+    data, expected = sample_trace()
+    for (offset, length, obj), want in zip(iter_record_spans(io.BytesIO(data)), expected):
+        assert obj == want
+        assert trace_parser.load_span(data[offset:offset + length]) == want
+
+def test_state_carries_records_across_ranges(tmp_path):
+    data, expected = sample_trace()
+    path = tmp_path / "trace.jsonl"
+    path.write_bytes(data)
+
+    # Cut inside the first pretty-printed record and inside a documents block.
+    inside_record = data.index(b'"nested"', data.index(b'"id": 3'))
+    inside_tag = data.index(b'{"hidden"')
+    bounds = sorted({0, data.rindex(b"\n", 0, inside_record) + 1, data.rindex(b"\n", 0, inside_tag) + 1, len(data)})
+
+    rows = []
+    state = {}
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        part, _, state = parse_range(str(path), start, end, state=state)
+        rows.extend(part)
+
+    assert rows == expected
+    assert trace_parser.is_clean(state)
+
+def test_parallel_reparses_only_unclean_shards(tmp_path, monkeypatch):
+    data, expected = sample_trace(60)
+    path = tmp_path / "trace.jsonl"
+    path.write_bytes(data)
+
+    line_starts = [0] + [i + 1 for i, byte in enumerate(data) if byte == 0x0a][:-1]
+    cuts = line_starts[::9]
+    shards = list(zip(cuts, cuts[1:] + [len(data)]))
+    monkeypatch.setattr(trace_parser, 'find_shard_bounds', lambda path, count: shards)
+
+    calls = []
+    original = trace_parser.parse_range
+    def counting_parse_range(*args, **kwargs):
+        calls.append(args[1:3])
+        return original(*args, **kwargs)
+    monkeypatch.setattr(trace_parser, 'parse_range', counting_parse_range)
+
+    stats = {}
+    records = list(iter_parallel(str(path), 2, stats=stats))
+
+    assert records == expected
+    assert stats['lines'] == data.count(b"\n")
+    # Workers run in fresh processes, so only the in-process re-parses are
+    # counted: at most one per shard, each covering that shard alone.
+    assert 0 < len(calls) < len(shards)
+    assert all(call in shards for call in calls)
+
+@pytest.mark.parametrize("shards", [1, 4, 16])
+def test_shard_bounds_cover_file(tmp_path, shards):
+    data, _ = sample_trace()
+    path = tmp_path / "trace.jsonl"
+    path.write_bytes(data)
+
+    bounds = find_shard_bounds(str(path), shards)
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(data)
+    assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
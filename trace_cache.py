@@ -0,0 +1,182 @@
+import hashlib
+import os
+import re
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from trace_parser import JSON_CHUNK_SIZE
+from trace_index import TraceIndex
+
+CACHE_VERSION = 4
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "chain-analyzer")
+CACHE_LIMIT_GB = 20
+CACHE_FILE_PATTERN = re.compile(r'^([0-9a-f]{32})(?:\.jsonl|-.+\.arrow)$')
+
+def content_hash(stream, chunk_size=JSON_CHUNK_SIZE):
+    h = hashlib.blake2b(digest_size=16)
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        h.update(chunk)
+    stream.seek(0)
+    return h.hexdigest()
+
+def path_digest(path):
+    # Hashing a multi-gigabyte local trace would cost as much as parsing it,
+    # so local files are identified by location, size and modification time.
+    stat = os.stat(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}".encode('utf-8'))
+    return h.hexdigest()
+
+def trace_key(digest, skip_xml=True, max_items=None):
+    return f"{digest}-v{CACHE_VERSION}-x{int(bool(skip_xml))}-n{max_items or 0}"
+
+def key_digest(key):
+    return key.split('-', 1)[0]
+
+def cache_path(key, cache_dir=DEFAULT_CACHE_DIR, table='steps'):
+    return os.path.join(cache_dir, f"{key}.{table}.arrow")
+
+def source_path(digest, cache_dir=DEFAULT_CACHE_DIR):
+    return os.path.join(cache_dir, f"{digest}.jsonl")
+
+def spool_upload(stream, digest, cache_dir=DEFAULT_CACHE_DIR, chunk_size=JSON_CHUNK_SIZE):
+    path = source_path(digest, cache_dir)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    stream.seek(0)
+    with open(tmp_path, 'wb') as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+    stream.seek(0)
+
+    os.replace(tmp_path, path)
+    return path
+
+def cache_entries(cache_dir=DEFAULT_CACHE_DIR):
+    # Spooled copies and Arrow indexes grouped by the digest they belong to,
+    # least recently used first. Other files in the cache are not counted.
+    entries = {}
+    for name in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+        match = CACHE_FILE_PATTERN.match(name)
+        if not match:
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        mtime, size, paths = entries.get(match.group(1), (0.0, 0, []))
+        entries[match.group(1)] = (max(mtime, stat.st_mtime), size + stat.st_size, paths + [path])
+    return sorted((mtime, size, digest, paths) for digest, (mtime, size, paths) in entries.items())
+
+def prune_cache(cache_dir=DEFAULT_CACHE_DIR, max_bytes=CACHE_LIMIT_GB * 2**30, keep=()):
+    # Digests in keep are in use. Their cache files are marked as recently used
+    # and never removed; the traces they were built from are not touched, since
+    # a local trace's mtime is part of its digest.
+    keep = set(keep)
+    entries = cache_entries(cache_dir)
+    for _, _, digest, paths in entries:
+        if digest in keep:
+            for path in paths:
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+
+    total = sum(size for _, size, _, _ in entries)
+    removed = []
+    for _, size, digest, paths in entries:
+        if total <= max_bytes:
+            break
+        if digest in keep:
+            continue
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+        removed.append(digest)
+    return removed
+
+def save_index(key, index, cache_dir=DEFAULT_CACHE_DIR):
+    if pa is None:
+        return None
+
+    qids = index.steps['question_id'].to_numpy()
+    question = pa.DictionaryArray.from_arrays(
+        pa.array(qids, type=pa.int32(), mask=qids < 0),
+        pa.array(index.question_names, type=pa.string())
+    )
+
+    table = pa.Table.from_pandas(index.steps.drop(columns=['question_id']), preserve_index=False)
+    table = table.append_column('question', question)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b'line_count': str(index.line_count),
+        b'skip_xml': str(int(index.skip_xml)),
+        b'source_path': index.source_path,
+    })
+
+    sources = pa.Table.from_pandas(index.sources, preserve_index=False)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_table(sources, cache_path(key, cache_dir, 'sources'))
+    return _write_table(table, cache_path(key, cache_dir))
+
+def _write_table(table, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    os.replace(tmp_path, path)
+    return path
+
+def _read_table(path):
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+def load_index(key, cache_dir=DEFAULT_CACHE_DIR):
+    if pa is None:
+        return None
+
+    path = cache_path(key, cache_dir)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        table = _read_table(path)
+        sources = _read_table(cache_path(key, cache_dir, 'sources')).to_pandas()
+    except (pa.ArrowInvalid, OSError):
+        return None
+
+    metadata = table.schema.metadata or {}
+    trace_path = metadata.get(b'source_path', b'').decode('utf-8')
+    if not os.path.exists(trace_path):
+        return None
+
+    question = table.column('question').combine_chunks()
+    steps = table.drop_columns(['question']).to_pandas()
+    steps['question_id'] = question.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype('int64')
+
+    return TraceIndex(
+        trace_path,
+        steps,
+        sources,
+        question.dictionary.to_pylist(),
+        int(metadata.get(b'line_count', b'0')),
+        metadata.get(b'skip_xml', b'1') == b'1'
+    )
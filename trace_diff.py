@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+
+from trace_stats import step_types
+
+ALIGN_COLUMNS = ['question', 'response_type', 'company_name', 'page_num', 'occurrence']
+DIFF_SORT_COLUMNS = {
+    'wall_delta': "Wall time",
+    'busy_delta': "Busy time",
+    'tokens_delta': "Total tokens",
+    'steps_added': "Added steps",
+    'steps_removed': "Removed steps",
+    'analyzed_removed': "Pages no longer analyzed",
+    'cited_removed': "Pages no longer cited",
+}
+
+def normalize_question(text):
+    return ' '.join(str(text).split()).lower().rstrip('?.! ')
+
+def question_codes(trace, keys):
+    return keys.get_indexer([normalize_question(name) for name in trace.question_names])
+
+def step_table(trace, codes):
+    steps = trace.steps
+    qids = steps['question_id'].to_numpy()
+    known = qids >= 0
+
+    table = pd.DataFrame({
+        'question': codes[np.where(known, qids, 0)] if len(codes) else 0,
+        'response_type': step_types(steps).astype(str).to_numpy(),
+        'company_name': steps['company_name'].astype(object).fillna('').to_numpy(),
+        'page_num': steps['page_num'].fillna(-1).astype('int64').to_numpy(),
+        'start_time': steps['start_time'].to_numpy(),
+        'end_time': steps['end_time'].to_numpy(),
+        'duration': steps['duration'].to_numpy(),
+        'total_tokens': steps['total_tokens'].to_numpy(),
+    })[known]
+    # Repeated (type, company, page) steps within a question pair up in order.
+    table['occurrence'] = table.groupby(ALIGN_COLUMNS[:-1], sort=False).cumcount()
+    return table
+
+def page_table(trace, table, codes):
+    analyzed = table.loc[table['page_num'] >= 0, ['question', 'page_num']].drop_duplicates()
+    sources = trace.sources.dropna(subset=['page_num'])
+    sources = sources[sources['question_id'].to_numpy() >= 0]
+    cited = pd.DataFrame({
+        'question': codes[sources['question_id'].to_numpy()],
+        'page_num': sources['page_num'].astype('int64').to_numpy(),
+    }).drop_duplicates()
+    return analyzed, cited
+
+def question_totals(table):
+    totals = table.groupby('question', sort=False).agg(
+        steps=('duration', 'size'),
+        start_time=('start_time', 'min'),
+        end_time=('end_time', 'max'),
+        busy=('duration', 'sum'),
+        tokens=('total_tokens', 'sum'),
+    )
+    totals['wall'] = totals['end_time'] - totals['start_time']
+    return totals.drop(columns=['start_time', 'end_time'])
+
+def count_by(frame, column, values):
+    counts = frame.groupby(['question', column], observed=True).size().unstack(fill_value=0)
+    return counts.reindex(columns=values, fill_value=0)
+
+def set_changes(base, new, prefix):
+    merged = base.merge(new, on=['question', 'page_num'], how='outer', indicator=True)
+    counts = count_by(merged, '_merge', ['right_only', 'left_only'])
+    counts.columns = [f"{prefix}_added", f"{prefix}_removed"]
+    return counts
+
+def align_steps(base_table, new_table):
+    merged = base_table.merge(
+        new_table, on=ALIGN_COLUMNS, how='outer', suffixes=('_base', '_new'), indicator=True
+    )
+    merged['status'] = merged['_merge'].map({'both': 'matched', 'left_only': 'removed', 'right_only': 'added'})
+    merged['duration_delta'] = merged['duration_new'] - merged['duration_base']
+    merged['tokens_delta'] = merged['total_tokens_new'] - merged['total_tokens_base']
+    return merged.drop(columns=['_merge', 'start_time_base', 'end_time_base', 'start_time_new', 'end_time_new'])
+
+def diff_traces(base, new):
+    # Questions are hash-joined on their normalized text, then carried as
+    # integer codes into a shared key index so the step merges compare ints.
+    names = {}
+    for trace in (new, base):
+        names.update((normalize_question(name), name) for name in trace.question_names)
+    keys = pd.Index(list(names))
+    base_codes = question_codes(base, keys)
+    new_codes = question_codes(new, keys)
+    base_table = step_table(base, base_codes)
+    new_table = step_table(new, new_codes)
+
+    base_totals = question_totals(base_table)
+    new_totals = question_totals(new_table)
+    questions = base_totals.join(new_totals, how='outer', lsuffix='_base', rsuffix='_new')
+    questions['status'] = np.select(
+        [questions['steps_base'].isna(), questions['steps_new'].isna()],
+        ['added', 'removed'],
+        'matched'
+    )
+    for column in ['steps', 'busy', 'tokens', 'wall']:
+        questions[f"{column}_delta"] = questions[f"{column}_new"] - questions[f"{column}_base"]
+
+    steps = align_steps(base_table, new_table)
+    status_counts = count_by(steps, 'status', ['added', 'removed'])
+    questions['steps_added'] = status_counts['added']
+    questions['steps_removed'] = status_counts['removed']
+    matched = steps[steps['status'] == 'matched']
+    questions['slowest_step_delta'] = matched.groupby('question', observed=True)['duration_delta'].max()
+
+    base_analyzed, base_cited = page_table(base, base_table, base_codes)
+    new_analyzed, new_cited = page_table(new, new_table, new_codes)
+    questions = questions.join(set_changes(base_analyzed, new_analyzed, 'analyzed'))
+    questions = questions.join(set_changes(base_cited, new_cited, 'cited'))
+
+    count_columns = ['steps_added', 'steps_removed', 'analyzed_added', 'analyzed_removed', 'cited_added', 'cited_removed']
+    questions[count_columns] = questions[count_columns].fillna(0).astype('int64')
+    question_keys = keys[questions.index]
+    questions.index = pd.Index(question_keys, name='key')
+    questions.insert(0, 'question', [names[key] for key in question_keys])
+    questions.insert(1, 'status', questions.pop('status'))
+    steps['question'] = pd.Categorical.from_codes(steps['question'].to_numpy(), categories=keys)
+    return questions.reset_index(), steps
+
+def biggest_regressions(questions, by='wall_delta', n=100):
+    ranked = questions[questions['status'] == 'matched'] if by.endswith('_delta') else questions
+    return ranked.sort_values(by, ascending=False, na_position='last').head(n)
+
+def question_steps(steps, key):
+    if key not in steps['question'].cat.categories:
+        return steps.iloc[:0]
+    code = steps['question'].cat.categories.get_loc(key)
+    return steps[steps['question'].cat.codes.to_numpy() == code]
@@ -0,0 +1,137 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_BATCH_SIZE = 2000
+EXPORT_FORMATS = {'parquet': "Parquet", 'ndjson': "NDJSON", 'csv': "CSV"}
+STEP_COLUMNS = [
+    'response_type', 'company_name', 'page_num', 'start_time', 'end_time', 'duration',
+    'prompt_tokens', 'completion_tokens', 'total_tokens', 'model',
+]
+STRING_COLUMNS = ['question', 'response_type', 'company_name', 'model', 'timestamp', 'finish_reason', 'content', 'parsed']
+FLOAT_COLUMNS = ['start_time', 'end_time', 'duration', 'prompt_tokens', 'completion_tokens', 'total_tokens']
+
+def select_rows(trace, question_ids=None, response_types=None):
+    steps = trace.steps
+    mask = np.ones(len(steps), dtype=bool)
+    if question_ids is not None:
+        mask &= np.isin(steps['question_id'].to_numpy(), list(question_ids))
+    if response_types is not None:
+        mask &= steps['response_type'].isin(list(response_types)).to_numpy()
+    return np.flatnonzero(mask)
+
+def response_fields(record):
+    response = record.get('response') if record else None
+    choice = {}
+    if isinstance(response, dict) and response.get('choices'):
+        choice = response['choices'][0] if isinstance(response['choices'][0], dict) else {}
+    message = choice.get('message') if isinstance(choice.get('message'), dict) else {}
+    parsed = message.get('parsed')
+    content = message.get('content')
+    timestamp = record.get('timestamp') if record else None
+
+    return (
+        None if timestamp is None else str(timestamp),
+        choice.get('finish_reason'),
+        content if content is None or isinstance(content, str) else json.dumps(content),
+        None if parsed is None else json.dumps(parsed, ensure_ascii=False),
+    )
+
+def export_columns(include_prompts=False):
+    columns = ['step', 'question_id', 'question', *STEP_COLUMNS, 'timestamp', 'finish_reason', 'content', 'parsed', 'answer_pages']
+    if include_prompts:
+        columns.append('user_prompt')
+    return columns
+
+def iter_export_batches(trace, rows=None, include_prompts=False, batch_size=EXPORT_BATCH_SIZE):
+    steps = trace.steps
+    if rows is None:
+        rows = np.arange(len(steps))
+    # Index -1 (steps before the first question) picks the None at the end.
+    names = np.array(list(trace.question_names) + [None], dtype=object)
+    sources = trace.sources.dropna(subset=['page_num'])
+    answer_pages = sources.groupby('step')['page_num'].agg(lambda pages: [int(p) for p in pages]).to_dict()
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        frame = steps.iloc[batch]
+        # Records are read straight from the trace and dropped after the batch,
+        # bypassing the per-question step cache.
+        records = [trace.read_record(row) for row in batch]
+        fields = list(zip(*(response_fields(record) for record in records)))
+        qids = frame['question_id'].to_numpy()
+
+        table = pd.DataFrame({
+            'step': batch.astype('int64'),
+            'question_id': qids,
+            'question': names[qids],
+            **{name: frame[name].to_numpy() for name in FLOAT_COLUMNS},
+        })
+        for name in ['response_type', 'company_name', 'model']:
+            table[name] = frame[name].astype(object).where(frame[name].notna(), None).to_numpy()
+        table['page_num'] = frame['page_num'].array
+        table['timestamp'], table['finish_reason'], table['content'], table['parsed'] = fields
+        table['answer_pages'] = [answer_pages.get(row, []) for row in batch]
+        if include_prompts:
+            table['user_prompt'] = [record.get('user_prompt') if record else None for record in records]
+        yield table[export_columns(include_prompts)]
+
+def parquet_schema(include_prompts=False):
+    types = {name: pa.string() for name in STRING_COLUMNS}
+    types.update({name: pa.float64() for name in FLOAT_COLUMNS})
+    types.update(step=pa.int64(), question_id=pa.int64(), page_num=pa.int64(), answer_pages=pa.list_(pa.int64()), user_prompt=pa.string())
+    return pa.schema([(name, types[name]) for name in export_columns(include_prompts)])
+
+def write_batches(batches, sink, fmt, include_prompts=False):
+    count = 0
+    if fmt == 'parquet':
+        if pq is None:
+            raise ImportError("Parquet export requires pyarrow")
+        schema = parquet_schema(include_prompts)
+        with pq.ParquetWriter(sink, schema) as writer:
+            for batch in batches:
+                writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+                count += len(batch)
+        return count
+
+    for batch in batches:
+        if fmt == 'ndjson':
+            text = batch.to_json(orient='records', lines=True, force_ascii=False)
+            if text and not text.endswith('\n'):
+                text += '\n'
+        else:
+            text = batch.to_csv(index=False, header=count == 0)
+        sink.write(text.encode('utf-8'))
+        count += len(batch)
+    return count
+
+def export_target(export_dir, name):
+    root = os.path.realpath(export_dir)
+    target = os.path.realpath(os.path.join(root, name))
+    if target == root or os.path.commonpath([root, target]) != root:
+        raise ValueError(f"{name} is outside the export directory")
+    return target
+
+def export_trace(trace, sink, fmt='parquet', rows=None, include_prompts=False, batch_size=EXPORT_BATCH_SIZE):
+    batches = iter_export_batches(trace, rows, include_prompts, batch_size)
+    if not isinstance(sink, str):
+        return write_batches(batches, sink, fmt, include_prompts)
+
+    tmp_path = f"{sink}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            count = write_batches(batches, f, fmt, include_prompts)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, sink)
+    return count
@@ -0,0 +1,309 @@
+import mmap
+import os
+import re
+import sys
+from array import array
+from collections import OrderedDict, defaultdict
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+from trace_parser import iter_record_spans, iter_parallel, load_span, PARALLEL_MIN_BYTES
+from records import StringStore, compact_record
+
+UNCLASSIFIED = "Unclassified Steps"
+NAN = float('nan')
+STEP_CACHE_SIZE = 8
+
+def parse_question(user_prompt):
+    match = re.search(r'Question:\s*(.*?)(?=\s*\n\s*Provide detailed reasoning|$)', user_prompt, re.DOTALL)
+    if match:
+        return match.group(1).strip()
+    match = re.search(r'Analyze the following question.*?:\s*\n\s*Question:\s*(.*?)(?=\s*\n|$)', user_prompt, re.DOTALL)
+    if match:
+        return match.group(1).strip()
+    return None
+
+def question_marker(item):
+    if item.get('response_type') == 'question_classifier' and 'user_prompt' in item:
+        return parse_question(item['user_prompt']) or ""
+    return None
+
+class QuestionSegmenter:
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.current = None
+
+    def assign(self, marker):
+        if marker is not None:
+            self.current = marker or f"Unknown Question #{len(self.names) + 1}"
+
+        name = self.current or UNCLASSIFIED
+        qid = self.ids.get(name)
+        if qid is None:
+            qid = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return qid
+
+def extract_questions(data):
+    segmenter = QuestionSegmenter()
+    questions = defaultdict(list)
+
+    for item in data:
+        if 'response_type' not in item:
+            continue
+        qid = segmenter.assign(question_marker(item))
+        questions[segmenter.names[qid]].append(item)
+
+    return questions
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+def _as_str(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+def _as_int(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _as_float(value):
+    try:
+        return float(value) if value is not None else NAN
+    except (TypeError, ValueError):
+        return NAN
+
+def answer_sources(item):
+    if item.get('response_type') != 'answer' or 'response' not in item:
+        return ()
+    try:
+        sources = item['response']['choices'][0]['message']['parsed'].get('sources', [])
+        return tuple(_as_int(source['page_number']) for source in sources if 'page_number' in source)
+    except (KeyError, IndexError, AttributeError, TypeError):
+        return ()
+
+def usage_fields(item):
+    response = item.get('response')
+    usage = response.get('usage') if isinstance(response, dict) else None
+    if not isinstance(usage, dict):
+        return NAN, NAN, NAN, _as_str(response.get('model')) if isinstance(response, dict) else None
+
+    prompt_tokens = _as_float(usage.get('prompt_tokens'))
+    completion_tokens = _as_float(usage.get('completion_tokens'))
+    total_tokens = _as_float(usage.get('total_tokens'))
+    if total_tokens != total_tokens:
+        total_tokens = np.nansum([prompt_tokens, completion_tokens])
+    return prompt_tokens, completion_tokens, total_tokens, _as_str(response.get('model'))
+
+def index_row(offset, length, obj):
+    return (
+        offset,
+        length,
+        _as_str(obj.get('response_type')),
+        _as_str(obj.get('company_name')) or None,
+        _as_int(obj.get('page_num')),
+        question_marker(obj),
+        _as_float(obj.get('start_time')),
+        _as_float(obj.get('end_time')),
+        answer_sources(obj),
+        *usage_fields(obj),
+    )
+
+class StepList(Sequence):
+    def __init__(self, index, question_id, rows):
+        self.index = index
+        self.question_id = question_id
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        return self.index.load_steps(self.question_id)[i]
+
+    def __iter__(self):
+        return iter(self.index.load_steps(self.question_id))
+
+class TraceIndex:
+    def __init__(self, source_path, steps, sources, question_names, line_count=0, skip_xml=True, question_rows=None):
+        self.source_path = source_path
+        self.steps = steps
+        self.sources = sources
+        self.question_names = question_names
+        self.line_count = line_count
+        self.skip_xml = skip_xml
+        self._offsets = steps['offset'].to_numpy()
+        self._lengths = steps['length'].to_numpy()
+        self._question_rows = question_rows
+        self._loaded = OrderedDict()
+        self.strings = StringStore()
+        self._file = None
+        self._mmap = None
+
+    def __len__(self):
+        return len(self.steps)
+
+    def question_rows(self):
+        if self._question_rows is None:
+            qids = self.steps['question_id'].to_numpy()
+            order = np.argsort(qids, kind='stable')
+            counts = np.bincount(qids[qids >= 0], minlength=len(self.question_names))
+            starts = np.cumsum(counts) - counts + int((qids < 0).sum())
+            self._question_rows = [order[start:start + count] for start, count in zip(starts, counts)]
+        return self._question_rows
+
+    def questions(self):
+        rows = self.question_rows()
+        return {name: StepList(self, qid, rows[qid]) for qid, name in enumerate(self.question_names)}
+
+    def question_frame(self, question_id):
+        return self.steps.iloc[self.question_rows()[question_id]]
+
+    def question_sources(self, question_id):
+        return self.sources[self.sources['question_id'].to_numpy() == question_id]
+
+    def _open(self):
+        if self._mmap is None:
+            self._file = open(self.source_path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def read_record(self, row):
+        offset = int(self._offsets[row])
+        end = offset + int(self._lengths[row])
+        try:
+            raw = self._open()[offset:end]
+        except ValueError:
+            # Closed by another thread between _open and the read; map again.
+            raw = self._open()[offset:end]
+        return load_span(raw, self.skip_xml)
+
+    def load_steps(self, question_id):
+        steps = self._loaded.get(question_id)
+        if steps is None:
+            steps = [compact_record(self.read_record(row), self.strings) for row in self.question_rows()[question_id]]
+            self._loaded[question_id] = steps
+            if len(self._loaded) > STEP_CACHE_SIZE:
+                self._loaded.popitem(last=False)
+                # Every string in the store then belongs to a loaded question,
+                # so an evicted question's text is freed with its records.
+                self.strings.clear()
+        else:
+            self._loaded.move_to_end(question_id)
+        return steps
+
+    def close(self):
+        self._loaded.clear()
+        self.strings.clear()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+class IndexBuilder:
+    def __init__(self, segmenter=None):
+        self.offsets = array('q')
+        self.lengths = array('q')
+        self.question_ids = array('q')
+        self.start_times = array('d')
+        self.end_times = array('d')
+        self.prompt_tokens = array('d')
+        self.completion_tokens = array('d')
+        self.total_tokens = array('d')
+        self.models = []
+        self.response_types = []
+        self.company_names = []
+        self.page_nums = []
+        self.source_rows = array('q')
+        self.source_pages = []
+        self.segmenter = segmenter or QuestionSegmenter()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def add(self, rows, max_items=None):
+        for (offset, length, response_type, company_name, page_num, marker, start_time, end_time, pages,
+             prompt, completion, total, model) in rows:
+            row = len(self.offsets)
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            self.response_types.append(_intern(response_type))
+            self.company_names.append(_intern(company_name))
+            self.page_nums.append(page_num)
+            self.question_ids.append(self.segmenter.assign(marker) if response_type is not None else -1)
+            self.start_times.append(start_time)
+            self.end_times.append(end_time)
+            self.prompt_tokens.append(prompt)
+            self.completion_tokens.append(completion)
+            self.total_tokens.append(total)
+            self.models.append(_intern(model))
+
+            for page in pages:
+                self.source_rows.append(row)
+                self.source_pages.append(page)
+
+            if max_items and len(self.offsets) >= max_items:
+                break
+
+    def frames(self):
+        # The frames share memory with the arrays, which cannot grow afterwards.
+        qids = np.frombuffer(self.question_ids, dtype=np.int64)
+        start = np.frombuffer(self.start_times, dtype=np.float64)
+        end = np.frombuffer(self.end_times, dtype=np.float64)
+
+        steps = pd.DataFrame({
+            'offset': np.frombuffer(self.offsets, dtype=np.int64),
+            'length': np.frombuffer(self.lengths, dtype=np.int64),
+            'response_type': pd.Categorical(self.response_types),
+            'company_name': pd.Categorical(self.company_names),
+            'page_num': pd.array(self.page_nums, dtype='Int64'),
+            'question_id': qids,
+            'start_time': start,
+            'end_time': end,
+            'duration': end - start,
+            'prompt_tokens': np.frombuffer(self.prompt_tokens, dtype=np.float64),
+            'completion_tokens': np.frombuffer(self.completion_tokens, dtype=np.float64),
+            'total_tokens': np.frombuffer(self.total_tokens, dtype=np.float64),
+            'model': pd.Categorical(self.models),
+        })
+
+        source_steps = np.frombuffer(self.source_rows, dtype=np.int64)
+        sources = pd.DataFrame({
+            'step': source_steps,
+            'question_id': qids[source_steps],
+            'page_num': pd.array(self.source_pages, dtype='Int64'),
+        })
+        return steps, sources
+
+def build_index(path, skip_xml=True, max_items=None, workers=1, on_progress=None, stream=None):
+    builder = IndexBuilder()
+    stats = {}
+
+    def report(bytes_read, line_count):
+        if on_progress:
+            on_progress(bytes_read, len(builder), builder.segmenter.names)
+
+    f = None
+    if stream is not None:
+        # Offsets index the bytes read from the stream; the caller makes them
+        # available at path before records are loaded.
+        rows = (index_row(*span) for span in iter_record_spans(stream, skip_xml, on_progress=report, stats=stats))
+    elif workers > 1 and os.path.getsize(path) >= PARALLEL_MIN_BYTES:
+        rows = iter_parallel(path, workers, skip_xml, report, stats, transform=index_row)
+    else:
+        f = open(path, 'rb')
+        rows = (index_row(*span) for span in iter_record_spans(f, skip_xml, on_progress=report, stats=stats))
+
+    try:
+        builder.add(rows, max_items)
+    finally:
+        rows.close()
+        if f:
+            f.close()
+
+    steps, sources = builder.frames()
+    return TraceIndex(path, steps, sources, builder.segmenter.names, stats.get('lines', 0), skip_xml)
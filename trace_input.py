@@ -0,0 +1,160 @@
+import bz2
+import glob
+import gzip
+import os
+import shutil
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from trace_parser import JSON_CHUNK_SIZE
+from trace_index import build_index
+from trace_cache import source_path, spool_upload, DEFAULT_CACHE_DIR
+
+TRACE_EXTENSIONS = ('.jsonl', '.json', '.txt')
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.zst')
+TRACE_PATTERNS = tuple(
+    f"*{ext}{suffix}" for ext in TRACE_EXTENSIONS for suffix in ('',) + COMPRESSED_EXTENSIONS
+)
+
+def trace_root(pattern):
+    # The directory a --trace file, directory or glob lives in, up to the
+    # first wildcard.
+    pattern = os.path.abspath(os.path.expanduser(pattern))
+    if os.path.isdir(pattern):
+        return pattern
+    parts = pattern.split(os.sep)
+    fixed = next((i for i, part in enumerate(parts) if glob.has_magic(part)), len(parts) - 1)
+    return os.sep.join(parts[:fixed]) or os.sep
+
+def within_root(path, root):
+    root = os.path.realpath(root)
+    path = os.path.realpath(path)
+    return os.path.commonpath([root, path]) == root
+
+def find_traces(inputs, recursive=False, root=None):
+    # With a root, inputs are resolved inside it and anything that leads
+    # outside, through .. or symlinks, is dropped.
+    paths = []
+    for item in inputs:
+        item = os.path.expanduser(item)
+        if root is not None:
+            item = os.path.join(root, item)
+        if os.path.isdir(item):
+            for pattern in TRACE_PATTERNS:
+                if recursive:
+                    pattern = os.path.join('**', pattern)
+                paths.extend(glob.glob(os.path.join(item, pattern), recursive=recursive))
+        else:
+            paths.extend(glob.glob(item, recursive=recursive) or ([item] if os.path.isfile(item) else []))
+    paths = [p for p in paths if os.path.isfile(p) and (root is None or within_root(p, root))]
+    return sorted(set(os.path.abspath(p) for p in paths))
+
+def compression(name):
+    name = (name or '').lower()
+    for suffix in COMPRESSED_EXTENSIONS:
+        if name.endswith(suffix):
+            return suffix
+    return None
+
+def decompress(raw, name):
+    suffix = compression(name)
+    if suffix == '.gz':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if suffix == '.bz2':
+        return bz2.BZ2File(raw, mode='rb')
+    if suffix == '.zst':
+        if zstandard is None:
+            raise ImportError("Reading .zst traces requires the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_size=JSON_CHUNK_SIZE, closefd=False)
+    return raw
+
+def open_trace(path):
+    raw = open(path, 'rb')
+    if not compression(path):
+        return raw
+    try:
+        return ClosingStream(decompress(raw, path), raw)
+    except Exception:
+        raw.close()
+        raise
+
+class ClosingStream:
+    def __init__(self, stream, raw):
+        self.stream = stream
+        self.raw = raw
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class SpoolReader:
+    def __init__(self, stream, spool):
+        self.stream = stream
+        self.spool = spool
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.spool.write(chunk)
+        return chunk
+
+def index_stream(raw, name, target, skip_xml=True, max_items=None, on_progress=None):
+    # The decompressed trace is parsed and written to target in one pass, so
+    # it is never held in memory; target then serves the lazy record reads.
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    stream = decompress(raw, name)
+    try:
+        with open(tmp_path, 'wb') as spool:
+            index = build_index(target, skip_xml, max_items, on_progress=on_progress, stream=SpoolReader(stream, spool))
+            # max_items can stop the parser early, but the spooled copy is
+            # shared by every key of this digest and must be complete.
+            shutil.copyfileobj(stream, spool, JSON_CHUNK_SIZE)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        if stream is not raw:
+            stream.close()
+
+    os.replace(tmp_path, target)
+    return index
+
+def load_source(source, digest, cache_dir=DEFAULT_CACHE_DIR, skip_xml=True, max_items=None, workers=1, on_progress=None):
+    if isinstance(source, str):
+        name = source
+        if not compression(name):
+            return build_index(source, skip_xml, max_items, workers, on_progress)
+    else:
+        name = getattr(source, 'name', '')
+        if not compression(name):
+            path = spool_upload(source, digest, cache_dir)
+            return build_index(path, skip_xml, max_items, workers, on_progress)
+
+    target = source_path(digest, cache_dir)
+    if os.path.exists(target):
+        return build_index(target, skip_xml, max_items, workers, on_progress)
+
+    if isinstance(source, str):
+        with open(source, 'rb') as raw:
+            return index_stream(raw, name, target, skip_xml, max_items, on_progress)
+
+    source.seek(0)
+    try:
+        return index_stream(source, name, target, skip_xml, max_items, on_progress)
+    finally:
+        source.seek(0)
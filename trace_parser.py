@@ -0,0 +1,226 @@
+import io
+import json
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+JSON_CHUNK_SIZE = 8 * 1024 * 1024
+SHARD_SCAN_SIZE = 1024 * 1024
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+SHARDS_PER_WORKER = 4
+
+def loads_bytes(raw):
+    try:
+        return json_loads(raw)
+    except ValueError:
+        try:
+            raw.decode('utf-8')
+        except UnicodeDecodeError:
+            return json_loads(raw.decode('latin-1'))
+        raise
+
+def iter_record_spans(stream, skip_xml=True, chunk_size=JSON_CHUNK_SIZE, on_progress=None, stats=None, base_offset=0, state=None):
+    if state is None:
+        state = {}
+    # state carries an open tag or a partial multi-line record into the next
+    # call, so a file can be parsed in consecutive ranges.
+    in_tag = state.get('in_tag', False)
+    json_parts = state.get('json_parts', [])
+    json_start = state.get('json_start', 0)
+    bracket_count = state.get('bracket_count', 0)
+    bytes_read = 0
+    line_counter = 0
+    pending = b""
+
+    if stats is None:
+        stats = {}
+
+    while True:
+        chunk = stream.read(chunk_size)
+        block_offset = base_offset + bytes_read - len(pending)
+        bytes_read += len(chunk)
+
+        if chunk:
+            buf = pending + chunk
+            cut = buf.rfind(b'\n')
+            if cut < 0:
+                pending = buf
+                continue
+            block, pending = buf[:cut], buf[cut + 1:]
+        elif pending:
+            block, pending = pending, b""
+        else:
+            break
+
+        lines = block.split(b'\n')
+        line_counter += len(lines)
+        stats['lines'] = line_counter
+        if on_progress:
+            on_progress(bytes_read, line_counter)
+
+        pos = block_offset
+        for raw in lines:
+            offset = pos
+            pos += len(raw) + 1
+
+            if skip_xml:
+                if b"<" in raw and b">" in raw:
+                    if any(tag in raw for tag in (b"<userStyle>", b"<documents>", b"<document")):
+                        in_tag = True
+                        continue
+
+                if b"</" in raw and b">" in raw:
+                    if any(tag in raw for tag in (b"</userStyle>", b"</documents>", b"</document>")):
+                        in_tag = False
+                        continue
+
+                if in_tag:
+                    continue
+
+            line = raw.strip()
+            if not line:
+                continue
+
+            if line[0] == 0x7b and line[-1] == 0x7d:
+                try:
+                    yield offset, len(raw), loads_bytes(line)
+                    continue
+                except ValueError:
+                    pass
+
+            if not json_parts:
+                if line[0] != 0x7b:
+                    # Only an opening brace can start a record; anything else
+                    # here is a log line or other noise.
+                    continue
+                json_start = offset
+            json_parts.append(line)
+            bracket_count += line.count(b'{') - line.count(b'}')
+
+            if bracket_count <= 0:
+                try:
+                    obj = loads_bytes(b"".join(json_parts))
+                except ValueError:
+                    obj = None
+                # A balanced buffer that does not parse is not a partial record;
+                # keeping it would swallow every multi-line record after it.
+                json_parts = []
+                bracket_count = 0
+                if obj is not None:
+                    yield json_start, offset + len(raw) - json_start, obj
+
+    stats['lines'] = line_counter
+    state.update(in_tag=in_tag, json_parts=json_parts, json_start=json_start, bracket_count=bracket_count)
+    # A shard that ends inside a tag or a partial record cannot be trusted on
+    # its own; iter_parallel re-reads it together with its successor.
+    stats['clean'] = not in_tag and not json_parts
+
+def iter_records(stream, skip_xml=True, chunk_size=JSON_CHUNK_SIZE, on_progress=None, stats=None):
+    for _, _, obj in iter_record_spans(stream, skip_xml, chunk_size, on_progress, stats):
+        yield obj
+
+def load_span(raw, skip_xml=True):
+    try:
+        return loads_bytes(raw)
+    except ValueError:
+        pass
+
+    # Multi-line records were parsed from their stripped lines joined together.
+    for obj in iter_records(io.BytesIO(raw), skip_xml):
+        return obj
+    return None
+
+class RangeReader:
+    def __init__(self, f, start, end):
+        self.f = f
+        self.f.seek(start)
+        self.remaining = end - start
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        chunk = self.f.read(size)
+        self.remaining -= len(chunk)
+        return chunk
+
+def find_shard_bounds(path, shards):
+    size = os.path.getsize(path)
+    bounds = [0]
+
+    with open(path, 'rb') as f:
+        for k in range(1, shards):
+            target = max(size * k // shards, bounds[-1])
+            f.seek(target)
+            window = f.read(SHARD_SCAN_SIZE)
+
+            # Prefer a line that opens a top-level object so pretty-printed
+            # records are rarely split between shards.
+            pos = window.find(b'\n{')
+            if pos < 0:
+                pos = window.find(b'\n')
+            if pos < 0:
+                continue
+
+            start = target + pos + 1
+            if bounds[-1] < start < size:
+                bounds.append(start)
+
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def record_only(offset, length, obj):
+    return obj
+
+def parse_range(path, start, end, skip_xml=True, transform=record_only, state=None):
+    stats = {}
+    state = {**state, 'json_parts': list(state.get('json_parts', []))} if state else {}
+    with open(path, 'rb') as f:
+        spans = iter_record_spans(RangeReader(f, start, end), skip_xml, stats=stats, base_offset=start, state=state)
+        rows = [transform(offset, length, obj) for offset, length, obj in spans]
+    return rows, stats.get('lines', 0), state
+
+def is_clean(state):
+    return not state.get('in_tag') and not state.get('json_parts')
+
+def _parse_shard(args):
+    return parse_range(*args)
+
+def iter_parallel(path, workers, skip_xml=True, on_progress=None, stats=None, transform=record_only):
+    shards = find_shard_bounds(path, workers * SHARDS_PER_WORKER)
+    line_count = 0
+
+    if stats is None:
+        stats = {}
+
+    # Streamlit serves reruns from threads, so forking the server is unsafe.
+    context = multiprocessing.get_context('spawn')
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    try:
+        results = executor.map(_parse_shard, [(path, start, end, skip_xml, transform) for start, end in shards])
+
+        state = {}
+        for (start, end), (rows, lines, end_state) in zip(shards, results):
+            # Workers parse every shard from a clean state. When the previous
+            # shard ended inside a tag or a record, only this shard is parsed
+            # again, continuing from where the previous one stopped.
+            if not is_clean(state):
+                rows, lines, end_state = parse_range(path, start, end, skip_xml, transform, state)
+            state = end_state
+
+            line_count += lines
+            stats['lines'] = line_count
+
+            if on_progress:
+                on_progress(end, line_count)
+
+            yield from rows
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
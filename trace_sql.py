@@ -0,0 +1,124 @@
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+QUERY_ROW_LIMIT = 10000
+ENGINE = 'DuckDB' if duckdb is not None else 'SQLite'
+# Queries come from any app user, so neither engine may touch the host: no
+# file access, extensions or attached databases, and no way to undo that.
+DUCKDB_CONFIG = {
+    'enable_external_access': False,
+    'autoinstall_known_extensions': False,
+    'autoload_known_extensions': False,
+    'lock_configuration': True,
+}
+SQLITE_ALLOWED = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+SQL_ERRORS = (sqlite3.Error,) + ((duckdb.Error,) if duckdb is not None else ())
+EXAMPLE_QUERY = """SELECT q.question, s.company_name, s.page_num, s.duration
+FROM steps s JOIN questions q USING (question_id)
+WHERE s.response_type = 'corporate_actions' AND s.duration > 20
+ORDER BY s.duration DESC"""
+TABLE_COLUMNS = {
+    'steps': ['step', 'question_id', 'response_type', 'company_name', 'page_num', 'start_time', 'end_time', 'duration'],
+    'questions': ['question_id', 'question', 'steps'],
+    'answer_sources': ['step', 'question_id', 'company_name', 'page_num'],
+    'usage': ['step', 'question_id', 'model', 'prompt_tokens', 'completion_tokens', 'total_tokens'],
+}
+SQLITE_INDEXES = {
+    'steps': ['question_id', 'response_type', 'company_name', 'duration'],
+    'usage': ['question_id', 'model'],
+    'answer_sources': ['question_id', 'page_num'],
+}
+
+def trace_tables(trace):
+    steps = trace.steps
+    qids = steps['question_id'].to_numpy()
+    step_ids = np.arange(len(steps))
+
+    return {
+        'steps': pd.DataFrame({
+            'step': step_ids,
+            'question_id': qids,
+            'response_type': steps['response_type'],
+            'company_name': steps['company_name'],
+            'page_num': steps['page_num'],
+            'start_time': steps['start_time'],
+            'end_time': steps['end_time'],
+            'duration': steps['duration'],
+        }),
+        'questions': pd.DataFrame({
+            'question_id': np.arange(len(trace.question_names)),
+            'question': trace.question_names,
+            'steps': np.bincount(qids[qids >= 0], minlength=len(trace.question_names)),
+        }),
+        'answer_sources': pd.DataFrame({
+            'step': trace.sources['step'],
+            'question_id': trace.sources['question_id'],
+            'company_name': steps['company_name'].to_numpy()[trace.sources['step'].to_numpy()],
+            'page_num': trace.sources['page_num'],
+        }),
+        'usage': pd.DataFrame({
+            'step': step_ids,
+            'question_id': qids,
+            'model': steps['model'],
+            'prompt_tokens': steps['prompt_tokens'],
+            'completion_tokens': steps['completion_tokens'],
+            'total_tokens': steps['total_tokens'],
+        }),
+    }
+
+def sqlite_authorizer(action, *args):
+    return sqlite3.SQLITE_OK if action in SQLITE_ALLOWED else sqlite3.SQLITE_DENY
+
+def sqlite_frame(frame):
+    # SQLite has no categorical or nullable integer types.
+    columns = {}
+    for name, column in frame.items():
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype(object).where(column.notna(), None)
+        elif column.dtype == 'Int64':
+            column = column.astype(object).where(column.notna(), None)
+        columns[name] = column
+    return pd.DataFrame(columns)
+
+class TraceDatabase:
+    def __init__(self, trace):
+        self.lock = threading.Lock()
+        self.tables = trace_tables(trace)
+        self.engine = ENGINE
+
+        if duckdb is not None:
+            self.connection = duckdb.connect(config=DUCKDB_CONFIG)
+            # Registered frames are scanned in place rather than copied.
+            for name, frame in self.tables.items():
+                self.connection.register(name, frame)
+        else:
+            self.connection = sqlite3.connect(':memory:', check_same_thread=False)
+            for name, frame in self.tables.items():
+                sqlite_frame(frame).to_sql(name, self.connection, index=False)
+                for column in SQLITE_INDEXES.get(name, []):
+                    self.connection.execute(f'CREATE INDEX "{name}_{column}" ON "{name}" ("{column}")')
+            self.connection.execute('PRAGMA query_only = ON')
+            self.connection.set_authorizer(sqlite_authorizer)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def query(self, sql, limit=QUERY_ROW_LIMIT):
+        with self.lock:
+            cursor = self.connection.execute(sql)
+            if cursor.description is None:
+                return pd.DataFrame(), False
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall() if limit is None else cursor.fetchmany(limit + 1)
+
+        truncated = limit is not None and len(rows) > limit
+        return pd.DataFrame.from_records(rows[:limit] if truncated else rows, columns=columns), truncated
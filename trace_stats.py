@@ -0,0 +1,263 @@
+import heapq
+import json
+import numpy as np
+import pandas as pd
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+def step_types(steps):
+    types = steps['response_type']
+    if types.isna().any():
+        types = types.cat.add_categories(['unknown']).fillna('unknown')
+    return types
+
+def latency_summary(steps):
+    timed = steps[steps['duration'].notna()]
+    if not len(timed):
+        return pd.DataFrame()
+
+    grouped = timed['duration'].groupby(step_types(timed), observed=True)
+    summary = grouped.agg(['count', 'mean', 'max'])
+    quantiles = grouped.quantile(list(PERCENTILES)).unstack()
+    quantiles.columns = [f"p{int(q * 100)}" for q in PERCENTILES]
+    summary = summary.join(quantiles)
+
+    overall = timed['duration']
+    summary.loc['all steps'] = [
+        len(overall), overall.mean(), overall.max(),
+        *overall.quantile(list(PERCENTILES)).to_numpy()
+    ]
+
+    summary['count'] = summary['count'].astype(int)
+    return summary[['count', 'mean', *quantiles.columns, 'max']]
+
+def duration_histogram(durations, bins=30):
+    durations = durations.dropna().to_numpy()
+    if not len(durations):
+        return pd.DataFrame()
+
+    counts, edges = np.histogram(durations, bins=bins)
+    return pd.DataFrame({'Steps': counts}, index=pd.Index(np.round(edges[:-1], 2), name='Duration (s)'))
+
+def slowest_steps(steps, question_names, n=20):
+    slowest = steps['duration'].nlargest(n)
+    rows = steps.loc[slowest.index]
+    qids = rows['question_id'].to_numpy()
+
+    return pd.DataFrame({
+        'question': [question_names[qid] if qid >= 0 else "" for qid in qids],
+        'response_type': rows['response_type'].astype(object),
+        'company_name': rows['company_name'].astype(object),
+        'page_num': rows['page_num'],
+        'duration': rows['duration'],
+        'start_time': rows['start_time'],
+    }, index=rows.index)
+
+TOKEN_COLUMNS = ['prompt_tokens', 'completion_tokens', 'total_tokens']
+DEFAULT_MODEL = 'default'
+
+def load_prices(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    return pd.DataFrame.from_dict(raw, orient='index', columns=['prompt', 'completion']).fillna(0.0)
+
+def price_table(steps, prices=None):
+    models = [DEFAULT_MODEL] + [str(m) for m in steps['model'].cat.categories]
+    table = pd.DataFrame(0.0, index=pd.Index(models, name='model'), columns=['prompt', 'completion'])
+    if prices is not None and len(prices):
+        table = prices.reindex(table.index.union(prices.index, sort=False))
+        # Models without a configured price start from the default row, not
+        # from zero, so the editable table prices them like step_costs would.
+        default = table.loc[DEFAULT_MODEL].fillna(0.0)
+        table = table.fillna(default)
+        table.index.name = 'model'
+    return table
+
+def step_costs(steps, prices):
+    prices = prices.astype(float)
+    if DEFAULT_MODEL in prices.index:
+        default = prices.loc[DEFAULT_MODEL]
+    else:
+        default = pd.Series({'prompt': 0.0, 'completion': 0.0})
+
+    per_model = prices.reindex(steps['model'].cat.categories).fillna(default)
+    # Category code -1 (no model) picks the default row appended at the end.
+    codes = steps['model'].cat.codes.to_numpy()
+    prompt_price = np.append(per_model['prompt'].to_numpy(), default['prompt'])[codes]
+    completion_price = np.append(per_model['completion'].to_numpy(), default['completion'])[codes]
+
+    prompt = np.nan_to_num(steps['prompt_tokens'].to_numpy())
+    completion = np.nan_to_num(steps['completion_tokens'].to_numpy())
+    return (prompt * prompt_price + completion * completion_price) / 1e6
+
+def token_usage(steps, by=None, prices=None, question_names=None):
+    duration = steps['duration'].to_numpy()
+    completion = steps['completion_tokens'].to_numpy()
+    total = steps['total_tokens'].to_numpy()
+    timed = ~np.isnan(duration) & ~np.isnan(total)
+
+    data = pd.DataFrame({
+        'steps': ~np.isnan(total),
+        'prompt_tokens': steps['prompt_tokens'].to_numpy(),
+        'completion_tokens': completion,
+        'total_tokens': total,
+        'timed_completion': np.where(timed, np.nan_to_num(completion), 0.0),
+        'timed_total': np.where(timed, total, 0.0),
+        'timed_duration': np.where(timed, duration, 0.0),
+        'cost': step_costs(steps, prices) if prices is not None else 0.0,
+    }, index=steps.index)
+
+    if by is None:
+        usage = data.sum().to_frame('whole run').T
+    else:
+        keys = step_types(steps) if by == 'response_type' else steps[by]
+        usage = data.groupby(keys, observed=True).sum()
+        if by == 'question_id' and question_names is not None:
+            usage = usage[usage.index >= 0]
+            usage.index = pd.Index([question_names[qid] for qid in usage.index], name='question')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        usage['completion_tok_per_s'] = usage['timed_completion'] / usage['timed_duration']
+        usage['total_tok_per_s'] = usage['timed_total'] / usage['timed_duration']
+
+    usage['steps'] = usage['steps'].astype(int)
+    usage = usage.drop(columns=['timed_completion', 'timed_total', 'timed_duration'])
+    return usage.sort_values('total_tokens', ascending=False)
+
+def page_ranges(pages):
+    ranges = []
+    for page in pages:
+        if ranges and page == ranges[-1][1] + 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ', '.join(f"{a}-{b}" if a != b else f"{a}" for a, b in ranges)
+
+def workflow_groups(steps):
+    types = step_types(steps).astype(str).to_numpy()
+    companies = steps['company_name'].astype(object).fillna('').to_numpy()
+    paged = steps['page_num'].notna().to_numpy()
+    position = np.arange(len(steps))
+
+    # Page-level steps collapse into one node per (type, company); every other
+    # step keeps a node of its own.
+    group = np.where(
+        paged,
+        pd.Series(types) + '\x00' + pd.Series(companies),
+        pd.Series(position).astype(str)
+    )
+
+    data = pd.DataFrame({
+        'group': group,
+        'position': position,
+        'response_type': types,
+        'company_name': companies,
+        'page_num': steps['page_num'].to_numpy(),
+        'start_time': steps['start_time'].to_numpy(),
+        'end_time': steps['end_time'].to_numpy(),
+        'duration': steps['duration'].to_numpy(),
+    })
+
+    grouped = data.groupby('group', sort=False)
+    groups = grouped.agg(
+        position=('position', 'min'),
+        response_type=('response_type', 'first'),
+        company_name=('company_name', 'first'),
+        steps=('position', 'size'),
+        start_time=('start_time', 'min'),
+        end_time=('end_time', 'max'),
+        busy=('duration', 'sum'),
+        slowest=('duration', 'max'),
+    )
+    groups['pages'] = grouped['page_num'].agg(lambda pages: sorted(set(pages.dropna().astype(int))))
+    groups['wall'] = groups['end_time'] - groups['start_time']
+    return groups.sort_values('position').reset_index(drop=True)
+
+def timeline_lanes(steps):
+    start = steps['start_time'].to_numpy()
+    end = steps['end_time'].to_numpy()
+    timed = ~np.isnan(start) & ~np.isnan(end)
+    if not timed.any():
+        return pd.DataFrame()
+
+    order = np.flatnonzero(timed)[np.argsort(start[timed], kind='stable')]
+    lanes = np.zeros(len(steps), dtype=int)
+    busy = []
+    free = []
+    for i in order:
+        while busy and busy[0][0] <= start[i]:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        lane = heapq.heappop(free) if free else len(busy)
+        lanes[i] = lane
+        heapq.heappush(busy, (end[i], lane))
+
+    origin = start[timed].min()
+    return pd.DataFrame({
+        'step': np.arange(1, len(steps) + 1)[timed],
+        'response_type': step_types(steps).astype(str).to_numpy()[timed],
+        'company_name': steps['company_name'].astype(object).fillna('').to_numpy()[timed],
+        'page_num': steps['page_num'].to_numpy()[timed],
+        'start': start[timed] - origin,
+        'end': end[timed] - origin,
+        'duration': end[timed] - start[timed],
+        'lane': lanes[timed],
+    })
+
+def question_summary(steps, sources, question_names):
+    steps = steps[steps['question_id'].to_numpy() >= 0]
+    grouped = steps.groupby('question_id')
+    summary = grouped.agg(
+        steps=('offset', 'size'),
+        start_time=('start_time', 'min'),
+        end_time=('end_time', 'max'),
+        busy=('duration', 'sum'),
+        slowest=('duration', 'max'),
+        total_tokens=('total_tokens', 'sum'),
+    )
+    summary['wall'] = summary['end_time'] - summary['start_time']
+
+    analyzed = steps.dropna(subset=['page_num']).groupby('question_id')['page_num'].nunique()
+    answer = sources.dropna(subset=['page_num']).groupby('question_id')['page_num'].nunique()
+    summary['analyzed_pages'] = analyzed.reindex(summary.index, fill_value=0)
+    summary['answer_pages'] = answer.reindex(summary.index, fill_value=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        summary['page_usage'] = summary['answer_pages'] / summary['analyzed_pages'].where(summary['analyzed_pages'] > 0)
+
+    summary.insert(0, 'question', [question_names[qid] for qid in summary.index])
+    return summary.drop(columns=['start_time', 'end_time']).reset_index(drop=True)
+
+def page_hits(steps, sources):
+    companies = steps['company_name'].cat.categories
+    company_codes = steps['company_name'].cat.codes.to_numpy()
+    qids = steps['question_id'].to_numpy()
+    page_nums = steps['page_num']
+
+    paged = (company_codes >= 0) & page_nums.notna().to_numpy()
+    analyzed = pd.DataFrame({
+        'company': company_codes[paged],
+        'page_num': page_nums[paged].astype('int64').to_numpy(),
+        'question_id': qids[paged],
+    })
+
+    # A citation belongs to the answer step's company, or failing that to the
+    # last company named in its question, as in the Document Pages tab.
+    named = (company_codes >= 0) & (qids >= 0)
+    last_company = pd.Series(company_codes[named]).groupby(qids[named]).last()
+    source_steps = sources['step'].to_numpy()
+    cited_codes = company_codes[source_steps]
+    fallback = last_company.reindex(sources['question_id'].to_numpy()).fillna(-1).astype('int64').to_numpy()
+    cited_codes = np.where(cited_codes >= 0, cited_codes, fallback)
+    cited_known = (cited_codes >= 0) & sources['page_num'].notna().to_numpy()
+    cited = pd.DataFrame({
+        'company': cited_codes[cited_known],
+        'page_num': sources['page_num'][cited_known].astype('int64').to_numpy(),
+    })
+
+    hits = analyzed.groupby(['company', 'page_num']).agg(
+        analyzed=('question_id', 'size'),
+        questions=('question_id', 'nunique'),
+    )
+    hits = hits.join(cited.groupby(['company', 'page_num']).size().rename('cited'), how='outer')
+    hits = hits.fillna(0).astype('int64').reset_index()
+    hits['company_name'] = pd.Categorical.from_codes(hits.pop('company').to_numpy(), categories=companies)
+    return hits[['company_name', 'page_num', 'analyzed', 'questions', 'cited']]
@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from trace_parser import iter_record_spans, RangeReader, SHARD_SCAN_SIZE
+from trace_index import IndexBuilder, QuestionSegmenter, TraceIndex, index_row
+
+INITIAL_CAPACITY = 1024
+BUILDER_FIELDS = {
+    'offset': 'offsets',
+    'length': 'lengths',
+    'question_id': 'question_ids',
+    'start_time': 'start_times',
+    'end_time': 'end_times',
+    'prompt_tokens': 'prompt_tokens',
+    'completion_tokens': 'completion_tokens',
+    'total_tokens': 'total_tokens',
+}
+
+def complete_end(f, start, size, window=SHARD_SCAN_SIZE):
+    # The writer may be halfway through a line; stop after the last newline.
+    end = size
+    while end > start:
+        pos = max(start, end - window)
+        f.seek(pos)
+        cut = f.read(end - pos).rfind(b'\n')
+        if cut >= 0:
+            return pos + cut + 1
+        end = pos
+    return start
+
+class GrowableArray:
+    def __init__(self, dtype, capacity=INITIAL_CAPACITY):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        end = self.size + len(values)
+        if end > len(self.data):
+            # Doubling keeps appends amortized O(new rows). Views handed out
+            # earlier keep the old buffer alive and stay valid.
+            grown = np.empty(max(end, 2 * len(self.data)), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:end] = values
+        self.size = end
+
+    def view(self):
+        return self.data[:self.size]
+
+class CategoryArray:
+    def __init__(self):
+        self.codes = GrowableArray(np.int32)
+        self.categories = []
+        self.ids = {}
+
+    def extend(self, values):
+        codes = []
+        for value in values:
+            if value is None:
+                codes.append(-1)
+                continue
+            code = self.ids.get(value)
+            if code is None:
+                code = self.ids[value] = len(self.categories)
+                self.categories.append(value)
+            codes.append(code)
+        self.codes.extend(codes)
+
+    def view(self):
+        return pd.Categorical.from_codes(self.codes.view(), categories=self.categories)
+
+class NullableIntArray:
+    def __init__(self):
+        self.values = GrowableArray(np.int64)
+        self.mask = GrowableArray(np.bool_)
+
+    def extend(self, values):
+        self.mask.extend([value is None for value in values])
+        self.values.extend([0 if value is None else value for value in values])
+
+    def view(self):
+        return pd.arrays.IntegerArray(self.values.view(), self.mask.view())
+
+class TraceTail:
+    def __init__(self, path, skip_xml=True):
+        self.path = path
+        self.skip_xml = skip_xml
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.size = 0
+        self.line_count = 0
+        self.inode = None
+        self.started = time.time_ns()
+        self.state = {}
+        self.segmenter = QuestionSegmenter()
+        self.numeric = {
+            name: GrowableArray(dtype) for name, dtype in [
+                ('offset', np.int64), ('length', np.int64), ('question_id', np.int64),
+                ('start_time', np.float64), ('end_time', np.float64), ('duration', np.float64),
+                ('prompt_tokens', np.float64), ('completion_tokens', np.float64), ('total_tokens', np.float64),
+            ]
+        }
+        self.categorical = {name: CategoryArray() for name in ['response_type', 'company_name', 'model']}
+        self.page_num = NullableIntArray()
+        self.source_step = GrowableArray(np.int64)
+        self.source_question = GrowableArray(np.int64)
+        self.source_page = NullableIntArray()
+        self.question_rows = []
+        if getattr(self, 'index', None) is not None:
+            self.index.close()
+        self.index = None
+
+    @property
+    def key(self):
+        # Stable while the file is followed: step rows never move, so caches of
+        # single steps and questions stay valid as the trace grows.
+        return f"tail-{self.inode}-{self.started}-x{int(bool(self.skip_xml))}"
+
+    @property
+    def version(self):
+        return len(self.numeric['offset'])
+
+    def refresh(self, on_progress=None):
+        with self.lock:
+            return self._refresh(on_progress)
+
+    def _refresh(self, on_progress):
+        stat = os.stat(self.path)
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # Rotated or truncated: the old offsets no longer point into this file.
+            self.reset()
+            self.inode = stat.st_ino
+        self.size = stat.st_size
+
+        with open(self.path, 'rb') as f:
+            end = complete_end(f, self.offset, stat.st_size)
+            if end <= self.offset and self.index is not None:
+                return 0
+
+            stats = {}
+            builder = IndexBuilder(self.segmenter)
+
+            def report(bytes_read, line_count):
+                if on_progress:
+                    on_progress(self.offset + bytes_read, len(builder), self.segmenter.names)
+
+            spans = iter_record_spans(
+                RangeReader(f, self.offset, end), self.skip_xml,
+                on_progress=report, stats=stats, base_offset=self.offset, state=self.state
+            )
+            builder.add(index_row(*span) for span in spans)
+
+        self.offset = end
+        self.line_count += stats.get('lines', 0)
+        added = len(builder)
+        if added:
+            self._append(builder)
+
+        previous = self.index
+        self.index = TraceIndex(
+            self.path, self._steps(), self._sources(), list(self.segmenter.names), self.line_count,
+            self.skip_xml, [rows.view() for rows in self.question_rows]
+        )
+        if previous is not None:
+            previous.close()
+        return added
+
+    def _append(self, builder):
+        first = self.version
+        for name, column in self.numeric.items():
+            if name != 'duration':
+                column.extend(getattr(builder, BUILDER_FIELDS[name]))
+        start = np.frombuffer(builder.start_times, dtype=np.float64)
+        end = np.frombuffer(builder.end_times, dtype=np.float64)
+        self.numeric['duration'].extend(end - start)
+        self.categorical['response_type'].extend(builder.response_types)
+        self.categorical['company_name'].extend(builder.company_names)
+        self.categorical['model'].extend(builder.models)
+        self.page_num.extend(builder.page_nums)
+
+        qids = np.frombuffer(builder.question_ids, dtype=np.int64)
+        source_steps = np.frombuffer(builder.source_rows, dtype=np.int64)
+        self.source_step.extend(source_steps + first)
+        self.source_question.extend(qids[source_steps])
+        self.source_page.extend(builder.source_pages)
+
+        # Only the new rows are grouped; each question's row list grows in place.
+        while len(self.question_rows) < len(self.segmenter.names):
+            self.question_rows.append(GrowableArray(np.int64, 64))
+        order = np.argsort(qids, kind='stable')
+        grouped = qids[order]
+        bounds = np.flatnonzero(np.diff(grouped)) + 1
+        for rows in np.split(order, bounds):
+            if len(rows) and qids[rows[0]] >= 0:
+                self.question_rows[qids[rows[0]]].extend(rows + first)
+
+    def _steps(self):
+        columns = {name: self.numeric[name].view() for name in ['offset', 'length']}
+        columns.update(
+            response_type=self.categorical['response_type'].view(),
+            company_name=self.categorical['company_name'].view(),
+            page_num=self.page_num.view(),
+        )
+        columns.update({name: self.numeric[name].view() for name in [
+            'question_id', 'start_time', 'end_time', 'duration', 'prompt_tokens', 'completion_tokens', 'total_tokens',
+        ]})
+        columns['model'] = self.categorical['model'].view()
+        return pd.DataFrame(columns, copy=False)
+
+    def _sources(self):
+        return pd.DataFrame({
+            'step': self.source_step.view(),
+            'question_id': self.source_question.view(),
+            'page_num': self.source_page.view(),
+        }, copy=False)